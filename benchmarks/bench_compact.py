@@ -0,0 +1,59 @@
+import gc
+import random
+import tracemalloc
+from time import perf_counter
+from .common import ROOT  # noqa: F401, sets up the import path
+from scholar_crawler.compact import CompactGraph
+from scholar_crawler.graph import AuthorGraph
+
+# Memory per edge of a co-authorship graph held as an `AuthorGraph` and as
+# a `CompactGraph`, both built from the same synthetic edge list.  Run with
+# `python -m benchmarks.bench_compact`.
+
+
+def edge_rows(n_docs=50000, n_authors=100000, seed=0):
+    """
+    Yields the node, node, doc rows of `n_docs` documents of 1 to 8 authors.
+    """
+    rnd = random.Random(seed)
+    for d in range(n_docs):
+        k = rnd.randint(1, 8)
+        authors = [f'id{rnd.randrange(n_authors)}' for _ in range(k)]
+        for i in range(k):
+            for j in range(i + 1, k):
+                yield authors[i], authors[j], f'doc{d}'
+
+
+def with_csr(graph):
+    graph.csr()
+    return graph
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    t = perf_counter()
+    graph = build()
+    elapsed = perf_counter() - t
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return graph, size, elapsed
+
+
+def main(n_docs=50000):
+    n_edges = sum(1 for _ in edge_rows(n_docs))
+    cases = [
+        ('AuthorGraph', lambda: AuthorGraph.from_egde_list(edge_rows(n_docs))),
+        ('CompactGraph', lambda: CompactGraph.from_rows(edge_rows(n_docs))),
+        ('CompactGraph + CSR', lambda: with_csr(CompactGraph.from_rows(edge_rows(n_docs)))),
+    ]
+    print(f'{n_docs} documents, {n_edges} edges')
+    print(f'  {"case":<32}{"bytes/edge":>12}{"build":>12}')
+    for name, build in cases:
+        graph, size, elapsed = measure(build)
+        print(f'  {name:<32}{size / n_edges:>12.1f}{elapsed:>11.2f}s')
+        del graph
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+from time import perf_counter
+from .common import ROOT  # noqa: F401, sets up the import path
+from . import fixtures
+from scholar_crawler.firefox import FirefoxSession, StubDriver
+from scholar_crawler.pool import SessionPool
+from scholar_crawler.queue import ScholarQueue
+from scholar_crawler.replay import PageArchive, ReplaySession
+from scholar_crawler.requests import AuthorSearch
+
+# End to end crawl throughput against a replayed crawl.  The fixture pages
+# are first recorded through a stub browser into a page archive, the crawl
+# is then replayed with a simulated page load time, in a single session
+# and in session pools, with and without injected captchas.  Run with
+# `python -m benchmarks.bench_crawl [steps] [latency]`.
+
+
+def fixture_page(url):
+    if 'as_epq' in url:
+        name = 'title_search.html'
+    elif 'user=' in url:
+        name = 'author.html'
+    else:
+        name = 'author_search.html'
+    return fixtures.load(name)[1]
+
+
+def scholar_queue(session, **kwargs):
+    sq = ScholarQueue(sleep_between=False, session=session, **kwargs)
+    sq.enqueue(AuthorSearch.from_author_string('J Reed'))
+    return sq
+
+
+def record(archive, steps):
+    live = FirefoxSession(driver=StubDriver(fixture_page))
+    sq = scholar_queue(ReplaySession(archive, 'record', live))
+    sq.crawl(steps)
+
+
+def replay(archive, steps, latency, sessions=0, captcha_rate=0.0):
+    """
+    Returns the pages crawled per minute, and the pages missing from the
+    archive.  Without `sessions` the crawl runs in the browser mode, in a
+    single session.
+    """
+    main = ReplaySession(archive, latency=latency,
+                         captcha_rate=0.0 if sessions else captcha_rate, seed=0)
+    kwargs = {}
+    replayed = [main]
+    if sessions:
+        replayed = [
+            ReplaySession(archive, latency=latency, captcha_rate=captcha_rate, seed=i)
+            for i in range(sessions)
+        ]
+        kwargs['session_pool'] = SessionPool(
+            sessions, factory=replayed.__getitem__, quarantine=latency * 20
+        )
+        replayed.append(main)
+    sq = scholar_queue(main, **kwargs)
+    t = perf_counter()
+    sq.crawl(steps, mode='pool' if sessions else 'browser')
+    elapsed = perf_counter() - t
+    if sessions:
+        sq.session_pool.close()
+    else:
+        # the injected captchas are solved by the replay, without the user
+        solved = sq.metrics.counter('scholar_captcha_total', mode='browser').value
+        assert solved == main.n_captchas, f'{solved} of {main.n_captchas} captchas'
+    pages = sq.metrics.meter('scholar_pages').total
+    return pages / elapsed * 60, sum(len(s.misses) for s in replayed)
+
+
+def main(steps=100, latency=0.02):
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = PageArchive(os.path.join(tmp, 'crawl.pages'))
+        record(archive, steps)
+        size = os.path.getsize(archive.path)
+        print(f'{len(archive)} pages recorded, {size / 2**10:.0f}kB archive, '
+              f'{latency * 1000:.0f}ms per page load')
+        print(f'  {"case":<32}{"pages/min":>12}{"misses":>8}')
+        cases = [
+            ('1 session', 0, 0.0),
+            ('1 session, 5% captchas', 0, 0.05),
+            ('4 sessions', 4, 0.0),
+            ('8 sessions', 8, 0.0),
+            ('8 sessions, 5% captchas', 8, 0.05),
+        ]
+        for name, sessions, rate in cases:
+            per_minute, misses = replay(archive, steps, latency, sessions, rate)
+            print(f'  {name:<32}{per_minute:>12,.0f}{misses:>8}')
+        archive.close()
+
+
+if __name__ == '__main__':
+    main(*[t(a) for t, a in zip((int, float), sys.argv[1:])])
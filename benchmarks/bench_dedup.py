@@ -0,0 +1,81 @@
+import random
+import string
+from itertools import count
+from .common import bench, report
+from graphs.graphs import Graph
+
+# Cost of adding a document for a parent author with thousands of
+# coauthors, with the (parent, filn) index compared to scanning all of the
+# parent's coauthors.  Run with `python -m benchmarks.bench_dedup`.
+
+
+class LegacyGraph(Graph):
+
+    def deduplicate_coauthors(self, parent, doc_coauthors, new_doc):
+        all_parent_coauthor_ids = self.authors[parent.author_id]
+
+        for ix in reversed(range(len(doc_coauthors))):
+            dca = doc_coauthors[ix]
+            if parent.filn == dca.filn:
+                doc_coauthors.pop(ix)
+                if not new_doc:
+                    self.author_ids[dca.author_id] = parent
+                continue
+            for a_id in all_parent_coauthor_ids:
+                pca = self.author_ids[a_id]
+                if dca.filn == pca.filn:
+                    if new_doc:
+                        doc_coauthors[ix] = pca
+                    elif pca is not dca:
+                        new_auth = dca.merge(pca)
+                        self.author_ids[dca.author_id] = new_auth
+                        self.author_ids[pca.author_id] = new_auth
+                        doc_coauthors[ix] = new_auth
+
+
+def names(n, seed=0):
+    rnd = random.Random(seed)
+    lasts = set()
+    while len(lasts) < n:
+        lasts.add(''.join(rnd.choices(string.ascii_lowercase, k=8)).title())
+    return [f'{rnd.choice(string.ascii_uppercase)} {last}' for last in sorted(lasts)]
+
+
+def build(cls, coauthors, per_doc=5):
+    g = cls()
+    g.add_author({'name': 'Parent Author', 'author_id': 'parent'})
+    for i in range(0, len(coauthors), per_doc):
+        g.add_document({
+            'title': f'setup {i}',
+            'parent_author': 'parent',
+            'authors': ['Parent Author'] + coauthors[i:i + per_doc],
+        })
+    return g
+
+
+def main():
+    rnd = random.Random(1)
+    rows = []
+    for n in (100, 1000, 5000):
+        coauthors = names(n)
+        new, old = build(Graph, coauthors), build(LegacyGraph, coauthors)
+        assert len(new.authors['parent']) == len(old.authors['parent']) == n
+        ids = count()
+
+        def add(g):
+            g.add_document({
+                'title': f'doc {next(ids)}',
+                'parent_author': 'parent',
+                'authors': ['Parent Author'] + rnd.sample(coauthors, 5),
+            })
+
+        rows.append((
+            f'add_document, {n} coauthors',
+            bench(lambda: add(new), repeat=3),
+            bench(lambda: add(old), repeat=3),
+        ))
+    report('Graph.add_document per document', rows)
+
+
+if __name__ == '__main__':
+    main()
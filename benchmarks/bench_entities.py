@@ -0,0 +1,95 @@
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from hashlib import md5
+from time import perf_counter
+from .common import ROOT  # noqa: F401, sets up the import path
+from graphs import graphs
+from scholar_crawler import requests
+from scholar_crawler.names import filn, shave_marks_latin
+
+# Memory and hashing throughput of the slotted entity classes with cached
+# hashes, compared to the classes with a __dict__ that hash on every call.
+# Run with `python -m benchmarks.bench_entities [n_entities]`.
+
+
+class LegacyAuthor:
+
+    def __init__(self, name, author_id=None, parent_id=None):
+        self.name = shave_marks_latin(name)
+        self.author_id = author_id
+        self.parent_id = parent_id
+        self.filn = filn(name)
+
+    def __eq__(self, other):
+        return hash(self) == hash(other)
+
+    def __hash__(self):
+        return int(md5(self.author_id.encode()).hexdigest()[:11], 16)
+
+
+@dataclass
+class LegacyDocument:
+    doc_id: str
+    title: str
+    parent_author: object
+    authors: list
+
+    def __post_init__(self):
+        self.__key = int(md5(self.doc_id.encode('latin1')).hexdigest()[:16], 16)
+
+    def __hash__(self):
+        return self.__key
+
+    def __eq__(self, other):
+        return self.__hash__() == other.__hash__()
+
+
+def graph_authors(cls, n):
+    return [cls('Ann Smith', f'#{i:09d}', 'parent') for i in range(n)]
+
+
+def crawl_documents(cls, n):
+    return [cls(f'doc{i:09d}', 'A title', None, []) for i in range(n)]
+
+
+def measure(build, n):
+    """Returns the bytes per entity of `build(n)`, and the seconds to build
+    the entities and to add them to a dict twice."""
+    gc.collect()
+    tracemalloc.start()
+    entities = build(n)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entities
+    gc.collect()
+
+    t = perf_counter()
+    entities = build(n)
+    built = perf_counter() - t
+    t = perf_counter()
+    index = {}
+    for e in entities:
+        index[e] = None
+    for e in entities:
+        index[e]
+    hashed = perf_counter() - t
+    return size / n, built, hashed
+
+
+def main(n=1000000):
+    cases = [
+        ('graphs.Author', graph_authors, graphs.Author, LegacyAuthor),
+        ('requests.Document', crawl_documents, requests.Document, LegacyDocument),
+    ]
+    print(f'{n} entities each')
+    print(f'  {"case":<24}{"bytes/entity":>14}{"build":>10}{"dict":>10}')
+    for name, make, new, old in cases:
+        for label, cls in (('new', new), ('old', old)):
+            per, built, hashed = measure(lambda k: make(cls, k), n)
+            print(f'  {name + " " + label:<24}{per:>14.1f}{built:>9.2f}s{hashed:>9.2f}s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,69 @@
+import random
+from .common import bench, report
+from scholar_crawler import names
+
+# Name normalization over a stream of co-author names drawn with a Zipf
+# like distribution, as they come up while ingesting, compared to running
+# the unicode normalization on every name.  Run with
+# `python -m benchmarks.bench_names`.
+
+FIRST = ['James', 'Maria', 'Wei', 'Olga', 'Ahmed', 'Anna', 'Kenji', 'John',
+         'J', 'M', 'A', 'K', 'S']
+LAST = ['Reed', 'Garcia', 'Zhang', 'Ivanova', 'Khan', 'Smith', 'Sato',
+        'Nguyen', 'Brown', 'Kim']
+# names with marks, a minority of the names in the crawls
+FIRST_MARKED = ['José', 'Zoë', 'Åsa', 'François', 'Jürgen']
+LAST_MARKED = ['Müller', 'García', 'Šimek', 'Ødegård', 'Dvořák',
+               'Łukasiewicz', 'Gonçalves', 'Núñez']
+
+
+def name_stream(n=10000, pool=5000, marked=0.15, seed=0):
+    rnd = random.Random(seed)
+
+    def part(plain, with_marks):
+        return rnd.choice(with_marks if rnd.random() < marked / 2 else plain)
+
+    pool = [
+        f'{part(FIRST, FIRST_MARKED)} {part(LAST, LAST_MARKED)}'
+        f'{rnd.randrange(pool) or ""}'
+        for _ in range(pool)
+    ]
+    weights = [1 / (i + 1) for i in range(len(pool))]
+    return rnd.choices(pool, weights, k=n)
+
+
+def legacy_filn(name):
+    f, l = name.lower().rsplit(' ', 1)
+    return (f[0], l)
+
+
+def main():
+    stream = name_stream()
+    n_ascii = sum(s.isascii() for s in stream)
+    print(f'{len(stream)} names, {n_ascii / len(stream):.0%} ascii, '
+          f'{len(set(stream))} distinct')
+
+    def new():
+        for s in stream:
+            names.shave_marks_latin(s)
+            names.filn(s)
+
+    def cold():
+        names.shave_marks_latin.cache_clear()
+        names.filn.cache_clear()
+        new()
+
+    def old():
+        for s in stream:
+            names._shave_marks_latin(s)
+            legacy_filn(s)
+
+    t_old = bench(old)
+    report('Name normalization per 10k names', [
+        ('memoized, warm cache', bench(new), t_old),
+        ('memoized, cold cache', bench(cold), t_old),
+    ])
+
+
+if __name__ == '__main__':
+    main()
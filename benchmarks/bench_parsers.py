@@ -0,0 +1,130 @@
+import re
+from urllib.parse import parse_qs
+from lxml import html
+from .common import bench, report
+from . import fixtures
+from scholar_crawler.requests import Author, AuthorSearch, Document, TitleSearch
+
+# Per-page cost of the page parsers against the saved fixture pages,
+# compared to the parsers that compiled their XPath and regexes on every
+# call.  Run with `python -m benchmarks.bench_parsers`.
+
+
+def legacy_author_search(req, h):
+    base = 'https://scholar.google.com'
+    author_links = h.xpath('//div[@class="gs_ai_t"]/h3/a')
+    authors = [
+        Author(
+            name=a.text,
+            profile_name=a.text,
+            author_id=parse_qs(a.get('href')).get('user')[0],
+            max_page=req.max_author_page,
+            request_url=base + a.get('href') + '&view_op=list_works'
+        )
+        for a in author_links
+    ]
+    next_btn = h.xpath('//button[contains(@class, "gs_btnPR") and @onclick]')
+    next_url = ''
+    if next_btn:
+        next_url = (base + next_btn[0].get('onclick', '').split('=')[-1]
+                    .strip("'").replace('\\x', '%'))
+    return [next_url] + authors
+
+
+def legacy_author(req, h):
+    author_id = parse_qs(h.url.split('?')[-1]).get('user', [])[0]
+    profile_name = h.xpath('//div[@id="gsc_prf_in"]')[0].text_content()
+    full_title = h.xpath('//div[@class="gsc_prf_il"]')[0].text_content()
+    institution = h.xpath('//a[@class="gsc_prf_ila"]')[0].text_content()
+    email_domain = h.xpath('//div[@id="gsc_prf_ivh"]')[0].text_content()
+    interests = h.xpath('//div[@id="gsc_prf_int"]/a/text()')
+    title_fragments = [
+        [t.strip(' -\xa0\u2026') for t in a.xpath('./text()')]
+        for a in h.xpath('//td[@class="gsc_a_t"]/a')
+    ]
+    title_fragments = [
+        [
+            f.strip() for frag in t_frags
+            for f in re.split(r'[^A-Za-z0-9;:" \[\]{},\.\-]+', frag)
+            if len(f.strip()) > 2
+        ]
+        for t_frags in title_fragments
+    ]
+    return [
+        TitleSearch.from_search_terms(t, req.hop+1, req)
+        for t in title_fragments
+    ]
+
+
+def legacy_title_search(req, h):
+    docs = []
+    for div in h.xpath('//div[@data-did]'):
+        doc_id = div.get('data-did')
+        full_title = ''.join(div.xpath('.//h3/a/text()|.//h3/a/svg/@aria-label'))
+        authors_nolink = [
+            n
+            for a in div.xpath('.//div[@class="gs_a"]/text()')
+            for n in a.split('\xa0')[0].strip('\u2026').split(', ')
+        ]
+        authors_nolink = [
+            Author(name=a, max_page=0) for a in authors_nolink if len(a) > 2
+        ]
+        authors_linked = [
+            Author(
+                name=a.xpath('./text()')[0],
+                author_id=parse_qs(a.xpath('./@href')[0]).get('/citations?user', [''])[0],
+                max_page=req.max_author_page
+            )
+            for a in div.xpath('.//div[@class="gs_a"]/a')
+        ]
+        if req.parent_author in authors_linked:
+            authors_linked.pop(authors_linked.index(req.parent_author))
+        authors_linked.append(req.parent_author)
+        docs.append(Document(doc_id, full_title, req.parent_author,
+                             authors_linked + authors_nolink))
+    return docs
+
+
+def load_tree(name):
+    url, content = fixtures.load(name)
+    h = html.fromstring(content)
+    h.url = url
+    return content, h
+
+
+def main():
+    parent = Author(name='J Reed', author_id='PARENTid1234', request_url='x')
+    cases = [
+        ('AuthorSearch.parse', 'author_search.html',
+         AuthorSearch('x'), lambda r, h: r.parse(h), legacy_author_search),
+        ('Author.parse', 'author.html',
+         Author(name='J Reed', author_id='PARENTid1234', max_page=1, request_url='x'),
+         lambda r, h: r.parse(h), legacy_author),
+        ('TitleSearch parser', 'title_search.html',
+         TitleSearch('x', parent_author=parent),
+         lambda r, h: list(r._search_parser_gen(h)), legacy_title_search),
+    ]
+    rows = []
+    for name, page, req, new, old in cases:
+        content, h = load_tree(page)
+        rows.append((
+            name,
+            bench(lambda: new(req, h)),
+            bench(lambda: old(req, h)),
+        ))
+        rows.append((
+            name + ' + lxml parse',
+            bench(lambda: new(req, load_h(content, h.url))),
+            bench(lambda: old(req, load_h(content, h.url))),
+        ))
+    report('Parser time per fixture page', rows)
+
+
+def load_h(content, url):
+    h = html.fromstring(content)
+    h.url = url
+    return h
+
+
+if __name__ == '__main__':
+    main()
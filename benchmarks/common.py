@@ -0,0 +1,42 @@
+import os
+import sys
+from time import perf_counter
+
+# lets the benchmarks import the packages of the repo when run from anywhere
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def bench(fn, repeat=5, min_time=0.2):
+    """
+    Times `fn()` and returns the best time per call in seconds.  Each of
+    the `repeat` rounds calls `fn` enough times to run for `min_time`.
+    """
+    number = 1
+    while True:
+        t = perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = perf_counter() - t
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        t = perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (perf_counter() - t) / number)
+    return best
+
+
+def report(title, rows):
+    """
+    Prints the (name, seconds, baseline seconds) rows as a table with the
+    speedup over the baseline.
+    """
+    print(title)
+    print(f'  {"case":<32}{"new":>12}{"old":>12}{"speedup":>10}')
+    for name, new, old in rows:
+        print(f'  {name:<32}{new*1e6:>10.1f}us{old*1e6:>10.1f}us{old/new:>9.2f}x')
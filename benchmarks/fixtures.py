@@ -0,0 +1,193 @@
+import os
+import random
+import string
+
+# Generates pages with the markup of Google Scholar's author search, author
+# profile and title search results, for benchmarking the parsers offline.
+# Run `python -m benchmarks.fixtures` to rewrite the saved fixture pages.
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+FIRST = [
+    'James', 'Maria', 'Wei', 'Olga', 'Ahmed', 'José', 'Anna', 'Kenji',
+    'Priya', 'Søren', 'Chloé', 'Mohammed', 'Elena', 'Li', 'Jürgen', 'Aoife',
+]
+LAST = [
+    'Reed', 'García', 'Zhang', 'Ivanova', 'Khan', 'Müller', 'Smith', 'Sato',
+    'Patel', 'Nielsen', 'Dubois', 'Al-Farsi', 'Rossi', 'Wang', 'Schäfer',
+    "O'Brien", 'Nguyen', 'Kowalski', 'Silva', 'Cohen',
+]
+WORDS = [
+    'analysis', 'network', 'deep', 'learning', 'graph', 'models', 'of', 'the',
+    'for', 'protein', 'dynamics', 'a', 'survey', 'novel', 'approach', 'to',
+    'quantum', 'estimation', 'robust', 'bayesian', 'inference', 'in', 'large',
+    'scale', 'systems', 'evidence', 'from', 'clinical', 'trials', 'α-helix',
+    'CO₂', 'non-linear', 'Schrödinger', '–', '(2nd', 'ed.)', 'μ-opioid',
+]
+JOURNALS = ['Nature', 'Science', 'Phys. Rev. Lett.', 'J. Chem. Phys.', 'PLoS One']
+
+
+def _id(rnd, k=12):
+    return ''.join(rnd.choices(string.ascii_letters + string.digits + '-_', k=k))
+
+
+def _name(rnd):
+    return f'{rnd.choice(FIRST)} {rnd.choice(LAST)}'
+
+
+def _initials(rnd):
+    return f'{rnd.choice(FIRST)[0]}{rnd.choice("ABCDEFGHJKLM" + " ")} {rnd.choice(LAST)}'.replace('  ', ' ')
+
+
+def _title(rnd):
+    return ' '.join(rnd.choices(WORDS, k=rnd.randint(5, 14))).capitalize()
+
+
+def author_search_page(n=10, seed=0, next_page=True):
+    """
+    Page of `n` results of an author search.
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        name = _name(rnd)
+        rows.append(
+            '<div class="gsc_1usr"><div class="gs_ai gs_scl gs_ai_chpr">'
+            f'<a href="/citations?hl=en&amp;user={_id(rnd)}" class="gs_ai_pho">'
+            '<span class="gs_rimg gs_pp_sm"><img alt="" src="/x.png"></span></a>'
+            '<div class="gs_ai_t"><h3 class="gs_ai_name">'
+            f'<a href="/citations?hl=en&amp;user={_id(rnd)}">{name}</a></h3>'
+            f'<div class="gs_ai_aff">Professor, {rnd.choice(LAST)} University</div>'
+            f'<div class="gs_ai_eml">Verified email at uni{rnd.randint(1, 99)}.edu</div>'
+            f'<div class="gs_ai_cby">Cited by {rnd.randint(1, 90000)}</div>'
+            '<div class="gs_ai_int">'
+            + ''.join(
+                f'<a class="gs_ai_one_int" href="/citations?view_op=search_authors'
+                f'&amp;hl=en&amp;mauthors=label:{w}">{w}</a>'
+                for w in rnd.sample(WORDS[:20], 3)
+            )
+            + '</div></div></div></div>'
+        )
+    btn = ''
+    if next_page:
+        btn = ('<button type="button" aria-label="Next" '
+               'class="gs_btnPR gs_in_ib gs_btn_half gs_btn_lsb gs_btn_srt '
+               'gsc_pgn_pnx" onclick="window.location=\'/citations?view_op'
+               '\\x3dsearch_authors\\x26hl\\x3den\\x26mauthors\\x3dreed'
+               '\\x26after_author\\x3dabc\\x26astart\\x3d10\'">'
+               '<span class="gs_ico"></span></button>')
+    return (
+        '<!doctype html><html><head><meta charset="utf-8"><title>Author search</title></head>'
+        f'<body><div id="gsc_sa_ccl">{"".join(rows)}</div>{btn}</body></html>'
+    )
+
+
+def author_page(n=100, seed=0):
+    """
+    Profile page of an author listing `n` publications.
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        authors = ', '.join(_initials(rnd) for _ in range(rnd.randint(1, 8)))
+        rows.append(
+            '<tr class="gsc_a_tr"><td class="gsc_a_t">'
+            f'<a href="/citations?view_op=view_citation&amp;hl=en&amp;'
+            f'citation_for_view={_id(rnd)}:{_id(rnd, 8)}" class="gsc_a_at">'
+            f'{_title(rnd)}</a>'
+            f'<div class="gs_gray">{authors}</div>'
+            f'<div class="gs_gray">{rnd.choice(JOURNALS)} {rnd.randint(1, 99)}, '
+            f'{rnd.randint(1, 999)}<span class="gs_oph">, {rnd.randint(1990, 2020)}'
+            '</span></div></td>'
+            f'<td class="gsc_a_c"><a class="gsc_a_ac gs_ibl">{rnd.randint(0, 999)}'
+            '</a></td><td class="gsc_a_y"><span class="gsc_a_h gsc_a_hc gs_ibl">'
+            f'{rnd.randint(1990, 2020)}</span></td></tr>'
+        )
+    interests = ''.join(
+        f'<a href="/citations?view_op=search_authors&amp;hl=en&amp;'
+        f'mauthors=label:{w}" class="gsc_prf_inta gs_ibl">{w}</a>'
+        for w in rnd.sample(WORDS[:20], 4)
+    )
+    return (
+        '<!doctype html><html><head><meta charset="utf-8"><title>Profile</title></head><body>'
+        f'<div id="gsc_prf_in">{_name(rnd)}</div>'
+        f'<div class="gsc_prf_il">Professor of {rnd.choice(WORDS).title()}</div>'
+        f'<div class="gsc_prf_il"><a href="/citations?view_op=view_org" '
+        f'class="gsc_prf_ila">{rnd.choice(LAST)} University</a></div>'
+        f'<div class="gsc_prf_il" id="gsc_prf_ivh">Verified email at uni.edu'
+        f'</div><div class="gsc_prf_il" id="gsc_prf_int">{interests}</div>'
+        '<table id="gsc_a_t"><tbody id="gsc_a_b">'
+        f'{"".join(rows)}</tbody></table></body></html>'
+    )
+
+
+def title_search_page(n=10, seed=0, parent_id='PARENTid1234'):
+    """
+    Page of `n` results of a title search.  The first result lists the
+    author with `parent_id`.
+    """
+    rnd = random.Random(seed)
+    docs = []
+    for i in range(n):
+        linked = [(_id(rnd), _initials(rnd)) for _ in range(rnd.randint(0, 3))]
+        if i == 0:
+            linked.append((parent_id, 'J Reed'))
+        links = [
+            f'<a href="/citations?user={u}&amp;hl=en&amp;oi=sra">{nm}</a>'
+            for u, nm in linked
+        ]
+        plain = [_initials(rnd) for _ in range(rnd.randint(1, 5))]
+        names = ', '.join(plain + links)
+        if rnd.random() < 0.3:
+            names += '…'
+        docs.append(
+            f'<div class="gs_r gs_or gs_scl" data-cid="{_id(rnd)}" '
+            f'data-did="{_id(rnd)}" data-lid="" data-rp="{i}">'
+            '<div class="gs_ri"><h3 class="gs_rt">'
+            f'<a href="https://example.org/{_id(rnd)}">{_title(rnd)}</a></h3>'
+            f'<div class="gs_a">{names}\xa0- {rnd.choice(JOURNALS)}, '
+            f'{rnd.randint(1990, 2020)} - example.org</div>'
+            f'<div class="gs_rs">{_title(rnd)} {_title(rnd)}</div></div></div>'
+        )
+    return (
+        '<!doctype html><html><head><meta charset="utf-8"><title>Search</title></head><body>'
+        f'<div id="gs_res_ccl_mid">{"".join(docs)}</div></body></html>'
+    )
+
+
+FIXTURES = {
+    'author_search.html': (
+        'https://scholar.google.com/citations?view_op=search_authors&mauthors=reed',
+        lambda: author_search_page(10)
+    ),
+    'author.html': (
+        'https://scholar.google.com/citations?user=PARENTid1234&hl=en'
+        '&cstart=0&pagesize=100&view_op=list_works&sortby=pubdate',
+        lambda: author_page(100)
+    ),
+    'title_search.html': (
+        'https://scholar.google.com/scholar?as_vis=1&as_sdt=1,5&as_q='
+        '&as_occt=title&as_epq="graph"',
+        lambda: title_search_page(10)
+    ),
+}
+
+
+def load(name):
+    """
+    Returns the url and the content of the saved fixture page `name`.
+    """
+    url, _ = FIXTURES[name]
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as fp:
+        return url, fp.read()
+
+
+def save():
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, (_, make) in FIXTURES.items():
+        with open(os.path.join(FIXTURE_DIR, name), 'w', encoding='utf-8') as fp:
+            fp.write(make())
+
+
+if __name__ == '__main__':
+    save()
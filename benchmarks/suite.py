@@ -0,0 +1,290 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+from lxml import html
+from .common import ROOT
+from . import fixtures, synthetic
+from graphs.graphs import Graph
+from scholar_crawler.graph import AuthorGraph
+from scholar_crawler.requests import Author, AuthorSearch, TitleSearch
+
+# Offline benchmark suite of the parsers and graph operations.  Reports the
+# throughput and peak memory of each operation and saves them as json, to
+# compare between runs:
+#
+#   python -m benchmarks.suite --docs 100000 --out before.json
+#   python -m benchmarks.suite --docs 100000 --out after.json --compare before.json
+#
+# Each case returns (items, unit, setup, run): `setup()` builds the inputs,
+# which are not measured, and `run(inputs)` is the measured operation.
+
+PAGES = 200
+
+
+def _tree(name):
+    url, content = fixtures.load(name)
+    h = html.fromstring(content)
+    h.url = url
+    return h
+
+
+def case_author_search_parse(n_docs, seed, tmp):
+    h = _tree('author_search.html')
+
+    def run(req):
+        for _ in range(PAGES):
+            req.parse(h)
+
+    return PAGES, 'pages', lambda: AuthorSearch('x'), run
+
+
+def case_author_parse(n_docs, seed, tmp):
+    h = _tree('author.html')
+
+    def setup():
+        return Author(name='J Reed', author_id='PARENTid1234', max_page=1,
+                      request_url='x')
+
+    def run(req):
+        for _ in range(PAGES):
+            req.parse(h)
+
+    return PAGES, 'pages', setup, run
+
+
+def case_title_search_parse(n_docs, seed, tmp):
+    h = _tree('title_search.html')
+    parent = Author(name='J Reed', author_id='PARENTid1234', request_url='x')
+
+    def run(req):
+        for _ in range(PAGES):
+            list(req._search_parser_gen(h))
+
+    return PAGES, 'pages', lambda: TitleSearch('x', parent_author=parent), run
+
+
+def case_add_publication(n_docs, seed, tmp):
+    def run(docs):
+        ag = AuthorGraph()
+        for doc in docs:
+            ag.add_publication(doc)
+
+    return n_docs, 'docs', lambda: synthetic.crawl_documents(n_docs, seed), run
+
+
+def _author_graph(n_docs, seed):
+    ag = AuthorGraph()
+    for doc in synthetic.crawl_documents(n_docs, seed):
+        ag.add_publication(doc)
+    return ag
+
+
+def case_export(n_docs, seed, tmp):
+    path = os.path.join(tmp, 'export.zip')
+    cache = {}
+
+    def setup():
+        if 'graph' not in cache:
+            cache['graph'] = _author_graph(n_docs, seed)
+        return cache['graph']
+
+    return n_docs, 'docs', setup, lambda ag: ag.export(path)
+
+
+def case_from_export(n_docs, seed, tmp):
+    path = os.path.join(tmp, 'import.zip')
+
+    def setup():
+        if not os.path.exists(path):
+            _author_graph(n_docs, seed).export(path)
+        return path
+
+    return n_docs, 'docs', setup, AuthorGraph.from_export
+
+
+def case_add_document(n_docs, seed, tmp):
+    def setup():
+        authors, documents = synthetic.graph_records(n_docs, seed=seed)
+        g = Graph()
+        for a in authors:
+            g.add_author(a)
+        return g, documents
+
+    def run(inputs):
+        g, documents = inputs
+        for d in documents:
+            g.add_document(d)
+
+    return n_docs, 'docs', setup, run
+
+
+def case_ingest_tinydb(n_docs, seed, tmp):
+    path = os.path.join(tmp, 'crawl.json')
+
+    def setup():
+        if not os.path.exists(path):
+            synthetic.write_tinydb(path, *synthetic.graph_records(n_docs, seed=seed))
+        return path
+
+    def run(path):
+        Graph().ingest_tindydb(path, print_status=False)
+
+    return n_docs, 'docs', setup, run
+
+
+CASES = {
+    'AuthorSearch.parse': case_author_search_parse,
+    'Author.parse': case_author_parse,
+    'TitleSearch._search_parser_gen': case_title_search_parse,
+    'AuthorGraph.add_publication': case_add_publication,
+    'AuthorGraph.export': case_export,
+    'AuthorGraph.from_export': case_from_export,
+    'Graph.add_document': case_add_document,
+    'Graph.ingest_tindydb': case_ingest_tinydb,
+}
+
+
+def measure(setup, run, repeat=3, memory=True):
+    """
+    Returns the best time of `repeat` runs, and the peak memory allocated
+    by a separate run traced with tracemalloc.
+    """
+    best = None
+    for _ in range(repeat):
+        inputs = setup()
+        gc.collect()
+        t = perf_counter()
+        run(inputs)
+        elapsed = perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+        del inputs
+
+    peak = None
+    if memory:
+        inputs = setup()
+        gc.collect()
+        tracemalloc.start()
+        run(inputs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(n_docs=10000, seed=0, repeat=3, memory=True, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, case in CASES.items():
+            if only and not any(o in name for o in only):
+                continue
+            items, unit, setup, run = case(n_docs, seed, tmp)
+            seconds, peak = measure(setup, run, repeat, memory)
+            results[name] = {
+                'items': items,
+                'unit': unit,
+                'seconds': seconds,
+                'per_second': items / seconds,
+                'peak_bytes': peak,
+            }
+            print_result(name, results[name])
+    return {'meta': metadata(n_docs, seed, repeat), 'results': results}
+
+
+def metadata(n_docs, seed, repeat):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'docs': n_docs,
+        'seed': seed,
+        'repeat': repeat,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def _mb(n):
+    return '-' if n is None else f'{n / 2**20:.1f}MB'
+
+
+def print_result(name, r):
+    rate = f'{r["per_second"]:,.0f} {r["unit"]}/s'
+    print(f'  {name:<34}{rate:>20}{r["seconds"]:>10.3f}s{_mb(r["peak_bytes"]):>12}')
+
+
+def compare(new, old, threshold=0.1):
+    """
+    Prints the change of each operation between the `old` and `new`
+    results.  Returns the names of the operations that lost more than
+    `threshold` of their throughput.
+    """
+    print(f'compared to {old["meta"].get("commit")} ({old["meta"].get("date")}), '
+          f'{old["meta"].get("docs")} docs')
+    print(f'  {"operation":<34}{"throughput":>12}{"peak memory":>14}')
+    regressions = []
+    for name, r in new['results'].items():
+        o = old['results'].get(name)
+        if o is None:
+            continue
+        speed = r['per_second'] / o['per_second']
+        mem = '-'
+        if r['peak_bytes'] and o['peak_bytes']:
+            mem = f'{r["peak_bytes"] / o["peak_bytes"]:.2f}x'
+        flag = ''
+        if speed < 1 - threshold:
+            regressions.append(name)
+            flag = '  <- slower'
+        print(f'  {name:<34}{speed:>11.2f}x{mem:>14}{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--docs', type=int, default=10000,
+                        help='number of synthetic documents for the graph operations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs of each operation, the best is kept')
+    parser.add_argument('--only', action='append',
+                        help='only run the operations with this in their name')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc run of each operation')
+    parser.add_argument('--out', help='save the results as json')
+    parser.add_argument('--compare', help='json results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='throughput loss reported as a regression')
+    args = parser.parse_args(argv)
+
+    # the baseline is read first, `--out` may overwrite it
+    old = None
+    if args.compare:
+        with open(args.compare) as fp:
+            old = json.load(fp)
+
+    print(f'{args.docs} documents')
+    results = run_suite(
+        args.docs, args.seed, args.repeat, not args.no_memory, args.only
+    )
+    if args.out:
+        with open(args.out, 'w') as fp:
+            json.dump(results, fp, indent=2)
+    if old is not None and compare(results, old, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
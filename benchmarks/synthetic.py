@@ -0,0 +1,95 @@
+import json
+import random
+from bisect import bisect
+from itertools import accumulate
+from .common import ROOT  # noqa: F401, sets up the import path
+from .fixtures import JOURNALS, _id, _initials, _name, _title
+from scholar_crawler.requests import Author, Document
+
+# Synthetic author and document records at a configurable scale, for the
+# graph benchmarks.  Authors are drawn with a Zipf like distribution so a
+# few authors have many documents, as in a real crawl.
+
+
+class Population:
+    """
+    Pool of `n` authors, a share of which have a profile id.
+    """
+    def __init__(self, n, profile_share=0.3, seed=0):
+        rnd = random.Random(seed)
+        self.names = [_name(rnd) if rnd.random() < 0.5 else _initials(rnd)
+                      for _ in range(n)]
+        self.ids = [_id(rnd) if rnd.random() < profile_share else ''
+                    for _ in range(n)]
+        self.cum_weights = list(accumulate(1 / (i + 1) for i in range(n)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def sample(self, rnd, k):
+        total = self.cum_weights[-1]
+        cw = self.cum_weights
+        return [bisect(cw, rnd.random() * total) for _ in range(k)]
+
+
+def crawl_documents(n_docs, seed=0, population=None):
+    """
+    Returns `n_docs` `requests.Document`s as parsed from title searches,
+    each with 1 to 8 authors, the first being the parent author.
+    """
+    rnd = random.Random(seed)
+    pop = population or Population(max(n_docs // 2, 10), seed=seed)
+    docs = []
+    for i in range(n_docs):
+        authors = [
+            Author(name=pop.names[j], author_id=pop.ids[j], max_page=0)
+            for j in pop.sample(rnd, rnd.randint(1, 8))
+        ]
+        docs.append(Document(f'd{i:x}{_id(rnd, 6)}', _title(rnd), authors[0], authors))
+    return docs
+
+
+def graph_records(n_docs, n_parents=None, seed=0):
+    """
+    Returns the (authors, documents) records read by `graphs.Graph`, as
+    stored in the TinyDB tables of a crawl.
+    """
+    rnd = random.Random(seed)
+    n_parents = n_parents or max(n_docs // 50, 1)
+    pop = Population(max(n_docs // 2, 10), seed=seed)
+    parents = [
+        {'name': _name(rnd), 'author_id': _id(rnd)} for _ in range(n_parents)
+    ]
+    documents = []
+    for i in range(n_docs):
+        parent = parents[min(pop.sample(rnd, 1)[0], n_parents - 1)]
+        coauthors = [pop.names[j] for j in pop.sample(rnd, rnd.randint(1, 7))]
+        documents.append({
+            'title': _title(rnd) + f' {i}',
+            'parent_author': parent['author_id'],
+            'authors': [parent['name']] + coauthors,
+            'Journal': rnd.choice(JOURNALS),
+            'Volume': str(rnd.randint(1, 99)),
+            'Pages': f'{rnd.randint(1, 999)}-{rnd.randint(1000, 1999)}',
+            'Publication date': str(rnd.randint(1990, 2020)),
+        })
+    return parents, documents
+
+
+def write_tinydb(path, authors, documents):
+    """
+    Writes the records to a TinyDB datastore with the default tables.
+    """
+    tables = {
+        'authors': {str(i): a for i, a in enumerate(authors, 1)},
+        'documents': {str(i): d for i, d in enumerate(documents, 1)},
+    }
+    # writing the file directly is much faster than inserting into TinyDB
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump(tables, fp)
+
+
+def write_jsonl(path, authors, documents):
+    with open(path, 'w', encoding='utf-8') as fp:
+        for record in authors + documents:
+            fp.write(json.dumps(record) + '\n')
@@ -1,38 +1,25 @@
+import json
 import random
-import unicodedata
-import string
 import jellyfish
 from collections import defaultdict
-from itertools import combinations, permutations
+from itertools import combinations, islice, permutations
 from hashlib import md5
-from tinydb import TinyDB, Query
-
-
-def shave_marks_latin(txt):
-    """Remove all diacritic marks from Latin base characters"""
-    norm_txt = unicodedata.normalize('NFD', txt)
-    latin_base = False
-    keepers = []
-    for c in norm_txt:
-        if unicodedata.combining(c) and latin_base:
-            continue # ignore diacritic on Latin base char
-        keepers.append(c)
-        # if it isn't combining char, it's a new base char
-        if not unicodedata.combining(c):
-            latin_base = c in string.ascii_letters
-    shaved = ''.join(keepers)
-    return unicodedata.normalize('NFC', shaved)
+from time import perf_counter
+from tinydb import TinyDB
+from scholar_crawler.names import filn, shave_marks_latin
 
 
 class Author:
+    __slots__ = ('name', '_author_id', 'parent_id', 'filn', '_hash', '_graph')
     _chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789' 
 
     def __init__(self, name, author_id=None, parent_id=None):
         self.name = shave_marks_latin(name)
         self.author_id = self._make_id(author_id)
         self.parent_id = parent_id
-        f, l = name.lower().rsplit(' ', 1)
-        self.filn = (f[0], l)
+        self.filn = filn(name)
+        # the Graph holding this author, set by `Graph.register_author`
+        self._graph = None
 
     def __repr__(self):
         n = self.__class__.__name__
@@ -43,6 +30,16 @@ class Author:
             return x
         return '#'+''.join(random.choices(self._chars, k=7))
 
+    @property
+    def author_id(self):
+        return self._author_id
+
+    @author_id.setter
+    def author_id(self, value):
+        # the hash is computed from the id when it is first needed
+        self._author_id = value
+        self._hash = None
+
     def __eq__(self, other):
         #return self.parent_id == other.parent_id and self.filn == other.filn
         return hash(self) == hash(other)
@@ -79,18 +76,41 @@ class Author:
         return self.__class__(name, author_id, pid)
 
     def update_to(self, other):
-        """Updates this object only to mirror `other`"""
+        """Updates this object only to mirror `other`.  The graph holding
+        this author, if any, points its indexes at the new id.
+        """
         if self.filn != other.filn:
             raise ValueError('The names of self and other do not match.')
+        old_id = self.author_id
         self.name = other.name
         self.author_id = other.author_id
         self.parent_id = other.parent_id
+        if self._graph is not None:
+            self._graph._author_updated(self, old_id)
 
     def __hash__(self):
-        return int(md5(self.author_id.encode()).hexdigest()[:11], 16)
+        h = self._hash
+        if h is None:
+            h = self._hash = int(md5(self._author_id.encode()).hexdigest()[:11], 16)
+        return h
     
 
 class Document:
+    __slots__ = (
+        'title',
+        'parent_author',
+        'authors',
+        'publication_date',
+        'pages',
+        'publisher',
+        'journal',
+        'volume',
+        'issue',
+        'conference',
+        'book',
+        'doc_id',
+        '_hash',
+    )
     _chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789' 
     
     def __init__(self, 
@@ -169,7 +189,7 @@ class Document:
                     + ''.join(self.authors) 
                     + self.parent_author
                 ).encode(errors='ignore')
-            )
+            ).hexdigest()
         return int(h[:11], 16)
 
     def __hash__(self):
@@ -206,6 +226,8 @@ class Graph:
         self.authors = defaultdict(set)
         # mapping of document to ids of authors
         self.documents = dict()
+        # mapping of (parent author_id, filn) to the id of the coauthor
+        self.coauthor_index = dict()
 
     def __repr__(self):
         n = self.__class__.__name__
@@ -220,9 +242,18 @@ class Graph:
             a_dict['author_id'],
             None
         )
-        self.author_ids[author.author_id] = author
+        self.register_author(author)
         self.authors[author.author_id]
 
+    def register_author(self, author, key=None):
+        """Adds `author` to `author_ids` under `key`, its id by default,
+        replacing any author there.  The author then keeps the graph's
+        indexes up to date when it is changed with `Author.update_to`.
+        """
+        author._graph = self
+        self.author_ids[author.author_id if key is None else key] = author
+        return author
+
     def add_document(self, d_dict):
         """Adds coauthors of the document to the graph with the document
         as the edges between all authors.
@@ -253,6 +284,12 @@ class Graph:
         # deduplicate and merge coauthors
         self.deduplicate_coauthors(parent, doc_coauthors, NEW_DOC)
 
+        # register the coauthors under the parent
+        for a in doc_coauthors:
+            if a.author_id not in self.author_ids:
+                self.register_author(a)
+            self.coauthor_index[parent_id, a.filn] = a.author_id
+
         # add coauthors to parent author's set
         doc_coauthor_ids = {a.author_id for a in doc_coauthors}
         self.authors[parent_id].update(doc_coauthor_ids)
@@ -262,13 +299,11 @@ class Graph:
         self.documents[doc] = doc_coauthor_ids
 
     def deduplicate_coauthors(self, parent, doc_coauthors, new_doc):
-        """Searches all of the parent's previous coauthors for duplicates in
-        the list of `doc_coauthors`.
+        """Looks up duplicates of the `doc_coauthors` among the parent's
+        previous coauthors, by first initial and last name.
 
         Mutates doc_coauthors.
         """
-        all_parent_coauthor_ids = self.authors[parent.parent_id]
-
         for ix in reversed(range(len(doc_coauthors))):
             dca = doc_coauthors[ix]
 
@@ -282,18 +317,120 @@ class Graph:
                 continue
 
             # check if the author already exists under the parent
-            for a_id in all_parent_coauthor_ids:
-                pca = self.author_ids[a_id]
-                if dca.filn == pca.filn:
-                    if new_doc:
-                        # replace with the existing coauthor
-                        doc_coauthors[ix] = pca
-                    else:
-                        # point existing keys to new author object
-                        new_auth = dca.merge(pca)
-                        self.author_ids[dca.author_id] = new_auth
-                        self.author_ids[pca.author_id] = new_auth
-                        doc_coauthors[ix] = new_auth
+            a_id = self.coauthor_index.get((parent.author_id, dca.filn))
+            if a_id is None:
+                continue
+            pca = self.author_ids[a_id]
+            if new_doc:
+                # replace with the existing coauthor
+                doc_coauthors[ix] = pca
+            elif pca is not dca:
+                # point existing keys to new author object
+                new_auth = dca.merge(pca)
+                self.register_author(new_auth, dca.author_id)
+                self.register_author(new_auth, pca.author_id)
+                doc_coauthors[ix] = new_auth
+
+    def update_author(self, author, other):
+        """Updates `author` to mirror `other`, see `Author.update_to`, and
+        points the graph's indexes at it.
+        """
+        author._graph = self
+        author.update_to(other)
+
+    def _author_updated(self, author, old_id):
+        """Points the indexes at `author` after its id changed from
+        `old_id`, called by `Author.update_to`.
+        """
+        self.author_ids[old_id] = author
+        self.author_ids[author.author_id] = author
+        for parent_id in (author.parent_id or '').split('|'):
+            if parent_id:
+                self.coauthor_index[parent_id, author.filn] = author.author_id
+
+    def merge_authors(self, groups):
+        """Merges each group of Author objects into a single author, with
+        the longest name and the highest id, so a profile id is kept over
+        generated '#' ids.  The documents, coauthors and indexes are
+        rewritten to the kept ids.
+
+        Returns the mapping of the replaced author ids to the kept ids.
+        """
+        merged = {}
+        for group in groups:
+            name = max((a.name for a in group), key=len)
+            author_id = max(a.author_id for a in group)
+            parents = [a.parent_id for a in group]
+            if None in parents:
+                pid = None
+            else:
+                pid = '|'.join(sorted({
+                    p for x in parents for p in x.split('|')
+                }))
+            new_auth = type(group[0])(name, author_id, pid)
+            new_auth._graph = self
+            for a in group:
+                merged[a.author_id] = new_auth
+
+        if not merged:
+            return {}
+
+        # point every key, including aliases from earlier merges, at the
+        # merged authors
+        for k, a in self.author_ids.items():
+            if a.author_id in merged:
+                self.author_ids[k] = merged[a.author_id]
+
+        def new_id(a_id):
+            a = self.author_ids.get(a_id)
+            return a_id if a is None else a.author_id
+
+        for doc, ids in self.documents.items():
+            self.documents[doc] = {new_id(i) for i in ids}
+
+        authors = defaultdict(set)
+        for a_id, ids in self.authors.items():
+            k = new_id(a_id) if a_id is not None else None
+            authors[k].update(new_id(i) for i in ids)
+            authors[k].discard(k)
+        self.authors = authors
+
+        self.coauthor_index = {
+            (new_id(p), filn): new_id(a_id)
+            for (p, filn), a_id in self.coauthor_index.items()
+        }
+        return {
+            a_id: a.author_id
+            for a_id, a in merged.items()
+            if a_id != a.author_id
+        }
+
+    def merge_documents(self, groups):
+        """Merges each group of duplicate documents into its first document.
+        The authors of the group are joined and become coauthors of each
+        parent author.  See `lsh.find_duplicate_documents`.
+
+        Returns the number of documents removed.
+        """
+        n = 0
+        for group in groups:
+            keep = group[0]
+            ids = set(self.documents[keep])
+            for doc in group[1:]:
+                ids.update(self.documents.pop(doc))
+                n += 1
+            self.documents[keep] = ids
+            for parent_id in {doc.parent_author for doc in group}:
+                self.authors[parent_id].update(ids - {parent_id})
+        return n
+
+    def deduplicate_documents(self, **kwargs):
+        """Finds near-duplicate documents by their titles and merges them,
+        see `lsh.find_duplicate_documents` for the arguments.
+        """
+        from .lsh import find_duplicate_documents
+        groups = find_duplicate_documents(self.documents, **kwargs)
+        return self.merge_documents(groups)
 
     def edge_list(self):
         """Returns the edgelist of the graph"""
@@ -340,38 +477,99 @@ class Graph:
                        doc_table='documents',
                        print_status=True):
         """Reads in the authors and documents from a TinyDB datastore
-        into the graph.
+        into the graph.  The document table is read once and grouped by
+        parent author.
+        """
+        db = TinyDB(db_path)
+        authors = db.table(author_table).all()
+        documents = db.table(doc_table).all()
+        self._ingest_grouped(authors, documents, print_status)
+
+    def ingest_jsonl(self, source, print_status=True, batch_size=10000):
+        """Reads in authors and documents from a JSON lines stream, one
+        record per line.  Records with a `parent_author` are documents, the
+        others are authors, and they can come in any order.  The stream is
+        inserted in batches of lines, the authors of a batch first, so only
+        the documents read before their parent author are held in memory.
+        Documents whose parent author is not in the stream are skipped.
+
+        source: [str, file, iterable] path of the file, or the lines
+        batch_size: [int] number of lines read and inserted at a time
         """
-        # moves the cursor left by n characters
-        def L(n):
-            return f'\033[{n}D'
+        if isinstance(source, str):
+            with open(source, encoding='utf-8') as fp:
+                return self.ingest_jsonl(fp, print_status, batch_size)
+
+        # documents waiting for their parent author, by parent author id
+        waiting = defaultdict(list)
+        n_auth = n_doc = 0
+        start = last = perf_counter()
+
+        def status():
+            elapsed = perf_counter() - start
+            rate = n_doc / elapsed if elapsed else 0
+            return (f'\rAuthors {n_auth} | Documents {n_doc}'
+                    f' | {rate:,.0f} docs/s   ')
+
+        lines = iter(source)
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                break
+            documents = []
+            for line in batch:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'parent_author' in record:
+                    documents.append(record)
+                    continue
+                self.add_author(record)
+                n_auth += 1
+                documents.extend(waiting.pop(record['author_id'], ()))
+            for d_dict in documents:
+                if d_dict['parent_author'] in self.author_ids:
+                    self.add_document(d_dict)
+                    n_doc += 1
+                else:
+                    waiting[d_dict['parent_author']].append(d_dict)
+            if print_status and perf_counter() - last >= 0.5:
+                last = perf_counter()
+                print(status(), end='', flush=True)
 
-        def _print(*args, ps=print_status, **kwargs):
-            if ps:
-                print(*args, **kwargs)
+        if print_status:
+            print(status())
 
-        ps = print_status
+    def _ingest_grouped(self, authors, documents, print_status=True):
+        """Adds each author followed by its documents.  Documents whose
+        parent author is not in `authors` are skipped.
+        """
+        by_parent = defaultdict(list)
+        for d_dict in documents:
+            by_parent[d_dict['parent_author']].append(d_dict)
 
-        db = TinyDB(db_path)
-        authors = db.table(author_table)
-        documents = db.table(doc_table)
-        q = Query()
+        n_auth = len(authors)
+        n_doc = sum(
+            len(by_parent.get(a['author_id'], ())) for a in authors
+        )
+        start = last = perf_counter()
+        done = 0
 
-        n_auth = authors.count(q)
-        
-        for i, a_dict in enumerate(authors.all(), 1):
-            self.add_author(a_dict)
-            _print(f'Authors {i} / {n_auth} | ', end='', ps=ps)
-            
-            q_imp = q.parent_author == a_dict['author_id']
-            n_doc = documents.count(q_imp)
+        def status():
+            elapsed = perf_counter() - start
+            rate = done / elapsed if elapsed else 0
+            return (f'\rAuthors {i} / {n_auth} | Documents {done} / {n_doc}'
+                    f' | {rate:,.0f} docs/s   ')
 
-            for j, d_dict in enumerate(documents.search(q_imp), 1):
+        i = 0
+        for i, a_dict in enumerate(authors, 1):
+            self.add_author(a_dict)
+            for d_dict in by_parent.get(a_dict['author_id'], ()):
                 self.add_document(d_dict)
-                msg = f'Documents {j} / {n_doc}   '
-                _print(msg + L(len(msg)), end='', ps=ps)
-
-            _print('\r', end='', ps=ps)
+                done += 1
+            if print_status and perf_counter() - last >= 0.5:
+                last = perf_counter()
+                print(status(), end='', flush=True)
 
         if print_status:
-            print()
\ No newline at end of file
+            print(status())
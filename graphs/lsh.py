@@ -0,0 +1,133 @@
+import re
+import unicodedata
+import zlib
+import numpy as np
+from collections import defaultdict
+from .resolution import UnionFind
+
+# Mersenne prime for the universal hashes of the MinHash permutations
+_PRIME = (1 << 31) - 1
+_NON_WORD = re.compile(r'[^a-z0-9 ]+')
+
+
+def shingles(title, k=4):
+    """Set of the character `k`-grams of the normalized `title`"""
+    t = unicodedata.normalize('NFKD', title.lower())
+    t = ' '.join(_NON_WORD.sub(' ', t).split())
+    if len(t) <= k:
+        return {t} if t else set()
+    return {t[i:i + k] for i in range(len(t) - k + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHash:
+    """MinHash signatures of shingle sets, with `num_perm` universal hash
+    functions standing in for random permutations.
+    """
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _PRIME, num_perm).astype(np.uint64)
+        self.b = rng.randint(0, _PRIME, num_perm).astype(np.uint64)
+
+    def signature(self, shingle_set):
+        if not shingle_set:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        x = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingle_set),
+            dtype=np.uint64,
+            count=len(shingle_set)
+        ) % _PRIME
+        return ((np.outer(x, self.a) + self.b) % _PRIME).min(axis=0)
+
+
+class LSHIndex:
+    """Locality sensitive hashing index of titles.  Each MinHash signature
+    is cut into `bands` bands, titles sharing any band are candidates.
+    Titles with a shingle Jaccard similarity of s become candidates with
+    probability 1 - (1 - s^r)^b, for r rows per band.
+    """
+
+    def __init__(self, num_perm=64, bands=16, k=4, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands.')
+        self.minhash = MinHash(num_perm, seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.k = k
+        self.keys = []
+        self.shingles = []
+        self.buckets = [defaultdict(list) for _ in range(bands)]
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {len(self.keys)} titles, {self.bands}x{self.rows}>'
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _bands(self, sig):
+        r = self.rows
+        return [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def add(self, key, title):
+        """Adds `title` under `key`.  Returns the indexes of the titles
+        already in the index that are candidates for it.
+        """
+        sh = shingles(title, self.k)
+        i = len(self.keys)
+        self.keys.append(key)
+        self.shingles.append(sh)
+        candidates = set()
+        for bucket, band in zip(self.buckets, self._bands(self.minhash.signature(sh))):
+            found = bucket[band]
+            candidates.update(found)
+            found.append(i)
+        return candidates
+
+    def query(self, title):
+        """Returns the keys of the candidates for `title`."""
+        sig = self.minhash.signature(shingles(title, self.k))
+        found = set()
+        for bucket, band in zip(self.buckets, self._bands(sig)):
+            found.update(bucket.get(band, ()))
+        return [self.keys[i] for i in found]
+
+
+def find_duplicate_documents(documents,
+                             threshold=0.85,
+                             metadata_threshold=0.5,
+                             min_similarity=0.6,
+                             **lsh_kwargs):
+    """Groups near-duplicate documents.  Candidates come from an
+    `LSHIndex` of the titles and are confirmed by the Jaccard similarity
+    of their title shingles: pairs above `threshold` match, and pairs
+    between `min_similarity` and `threshold` match when their metadata
+    similarity is at least `metadata_threshold`.
+
+    documents: [iterable] of graphs.Document
+    return: [list] of lists of duplicate documents
+    """
+    documents = list(documents)
+    index = LSHIndex(**lsh_kwargs)
+    uf = UnionFind()
+    for i, doc in enumerate(documents):
+        for j in index.add(i, doc.title):
+            sim = jaccard(index.shingles[i], index.shingles[j])
+            if sim >= threshold:
+                uf.union(i, j)
+            elif sim >= min_similarity:
+                other = documents[j]
+                meta = doc.dict_similarity(doc.metadata, other.metadata)
+                if meta >= metadata_threshold:
+                    uf.union(i, j)
+    return [
+        [documents[i] for i in sorted(group)]
+        for group in uf.groups()
+    ]
@@ -0,0 +1,248 @@
+import os
+import jellyfish
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+# jellyfish renamed jaro_distance to jaro_similarity
+jaro = getattr(jellyfish, 'jaro_similarity', None) or jellyfish.jaro_distance
+
+
+class UnionFind:
+    """Disjoint sets of ids.  With `exclusive`, a set holds at most one of
+    the ids for which `exclusive(id)` is true, e.g. at most one real
+    (profile) author id.  With `cannot_link`, ids that share one of the
+    keys returned by `cannot_link(id)`, e.g. the authors of a document,
+    are never in the same set.
+    """
+
+    def __init__(self, exclusive=None, cannot_link=None):
+        self.parent = {}
+        self.size = {}
+        self.exclusive = exclusive
+        self.cannot_link = cannot_link
+        # root -> the exclusive id in its set
+        self.real_id = {}
+        # root -> the cannot link keys of its set
+        self.keys = {}
+
+    def find(self, x):
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.size[x] = 1
+            if self.exclusive is not None and self.exclusive(x):
+                self.real_id[x] = x
+            if self.cannot_link is not None:
+                self.keys[x] = set(self.cannot_link(x))
+            return x
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        """Joins the sets of `a` and `b`.  Returns False when they are
+        already joined, hold different exclusive ids or share a cannot link
+        key.
+        """
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        real_a, real_b = self.real_id.get(ra), self.real_id.get(rb)
+        if real_a and real_b:
+            return False
+        keys_a, keys_b = self.keys.get(ra), self.keys.get(rb)
+        if keys_a and keys_b and not keys_a.isdisjoint(keys_b):
+            return False
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+            keys_a, keys_b = keys_b, keys_a
+        self.parent[rb] = ra
+        self.size[ra] += self.size.pop(rb)
+        real = real_a or real_b
+        self.real_id.pop(rb, None)
+        if real:
+            self.real_id[ra] = real
+        if keys_b is not None:
+            del self.keys[rb]
+            if keys_a is None:
+                self.keys[ra] = keys_b
+            else:
+                # merge the smaller set into the larger
+                if len(keys_a) < len(keys_b):
+                    keys_a, keys_b = keys_b, keys_a
+                keys_a |= keys_b
+                self.keys[ra] = keys_a
+        return True
+
+    def groups(self):
+        """Returns the sets with more than one id."""
+        out = defaultdict(list)
+        for x in self.parent:
+            out[self.find(x)].append(x)
+        return [g for g in out.values() if len(g) > 1]
+
+
+def phonetic_key(author):
+    """First initial and metaphone code of the last name"""
+    last = author.name.rsplit(' ', 1)[-1]
+    return author.filn[0], jellyfish.metaphone(last)
+
+
+def candidate_blocks(authors, max_block=1000, window=20):
+    """Groups authors that may be the same person into blocks of
+    (author_id, lowercase name, filn) tuples.  Authors are blocked by
+    `filn` and by `phonetic_key`.  Blocks larger than `max_block` are
+    sorted by name and split into overlapping windows of `window` authors.
+    """
+    by_filn = defaultdict(list)
+    by_sound = defaultdict(list)
+    for a in authors:
+        entry = (a.author_id, a.name.lower(), a.filn)
+        by_filn[a.filn].append(entry)
+        by_sound[phonetic_key(a)].append(entry)
+
+    # phonetic blocks only add pairs that do not share a filn
+    sound_blocks = [
+        b for b in by_sound.values()
+        if len({e[2] for e in b}) > 1
+    ]
+    for block in list(by_filn.values()) + sound_blocks:
+        if len(block) < 2:
+            continue
+        if len(block) <= max_block:
+            yield block
+            continue
+        block = sorted(block, key=lambda e: e[1])
+        step = max(window - 1, 1)
+        for i in range(0, len(block) - 1, step):
+            yield block[i:i + window]
+
+
+def score_blocks(blocks, filn_threshold, phonetic_threshold):
+    """Scores the pairs of authors within each block.  Runs in the worker
+    processes of `resolve_authors`.
+
+    return: [list] of (author_id, author_id, score) for the pairs above
+        their threshold
+    """
+    out = []
+    for block in blocks:
+        # a block with several filns is a phonetic block, its pairs with the
+        # same filn are scored in their filn block
+        phonetic = len({e[2] for e in block}) > 1
+        threshold = phonetic_threshold if phonetic else filn_threshold
+        for (id1, n1, f1), (id2, n2, f2) in combinations(block, 2):
+            if id1 == id2 or (phonetic and f1 == f2):
+                continue
+            score = jaro(n1, n2)
+            if score >= threshold:
+                out.append((id1, id2, score))
+    return out
+
+
+def batches(blocks, batch_size):
+    """Groups blocks into batches of about `batch_size` pairs"""
+    batch = []
+    n = 0
+    for block in blocks:
+        batch.append(block)
+        n += len(block) * (len(block) - 1) // 2
+        if n >= batch_size:
+            yield batch
+            batch = []
+            n = 0
+    if batch:
+        yield batch
+
+
+def cannot_link_keys(graph):
+    """Returns the mapping of author ids to the documents and parent
+    authors they are listed under.  Authors that share a document or a
+    parent are different people: the coauthors of a parent are already
+    deduplicated by `filn` when the documents are added.
+    """
+    keys = defaultdict(set)
+
+    def current(a_id):
+        a = graph.author_ids.get(a_id)
+        return a_id if a is None else a.author_id
+
+    for doc, ids in graph.documents.items():
+        for a_id in ids:
+            keys[current(a_id)].add(('doc', doc.doc_id))
+    for parent_id, ids in graph.authors.items():
+        if parent_id is None:
+            continue
+        parent_id = current(parent_id)
+        keys[parent_id].add(('parent', parent_id))
+        for a_id in ids:
+            keys[current(a_id)].add(('parent', parent_id))
+    return keys
+
+
+def resolve_authors(graph,
+                    filn_threshold=0.9,
+                    phonetic_threshold=0.93,
+                    max_block=1000,
+                    window=20,
+                    batch_size=20000,
+                    workers=None):
+    """Merges the authors of `graph` that are the same person found through
+    different parent authors.  Candidates are blocked by `filn` and by a
+    phonetic key of the name, the pairs within each block are scored with
+    the Jaro similarity of their names in a process pool, and the matches
+    are joined with union-find.  Two authors with profile ids are never
+    merged, nor are authors of the same document or parent author, see
+    `cannot_link_keys`.
+
+    graph: [Graph] graph to resolve in place
+    filn_threshold: [float] minimum score for authors with the same filn,
+        high enough to keep e.g. "John Smith" and "Jane Smith" apart
+    phonetic_threshold: [float] minimum score for authors that only share
+        the phonetic key
+    max_block: [int] blocks with more authors are compared in windows
+    window: [int] size of the windows of large blocks
+    batch_size: [int] approximate number of pairs sent to a worker at once
+    workers: [int] number of processes, 0 scores in this process
+    return: [dict] mapping of merged author ids to their new id
+    """
+    # unique author objects, author_ids also holds aliases from merges
+    authors = {}
+    for a in graph.author_ids.values():
+        authors.setdefault(a.author_id, a)
+
+    blocks = candidate_blocks(authors.values(), max_block, window)
+    args = (filn_threshold, phonetic_threshold)
+    if workers == 0:
+        results = (score_blocks(b, *args) for b in batches(blocks, batch_size))
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers or os.cpu_count())
+        results = pool.map(
+            _score_batch,
+            ((b,) + args for b in batches(blocks, batch_size))
+        )
+
+    # ids beginning with '#' are generated and can be merged freely
+    keys = cannot_link_keys(graph)
+    uf = UnionFind(lambda x: not x.startswith('#'), lambda x: keys.get(x, ()))
+    try:
+        matches = [m for r in results for m in r]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    # join the best matches first, so a set takes the closest real id
+    for id1, id2, _ in sorted(matches, key=lambda m: -m[2]):
+        uf.union(id1, id2)
+
+    return graph.merge_authors(
+        [[authors[i] for i in group] for group in uf.groups()]
+    )
+
+
+def _score_batch(args):
+    return score_blocks(*args)
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from functools import partial
+from time import monotonic
+from urllib.parse import urlsplit
+from .requests import RequestQueue
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing on average `rate` acquisitions per second, with
+    bursts of up to `burst` acquisitions.
+    """
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = monotonic()
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {self.rate}/s, burst={self.burst}>'
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self):
+        """
+        Takes a token and returns 0 if one is available, otherwise returns
+        the seconds until the next token is available.
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        wait = self.wait_time()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.wait_time()
+
+
+class AsyncRequestQueue(RequestQueue):
+    """
+    Class for queuing up http requests to be processed, with the request
+    rate limited per host by a token bucket.
+
+    Requests wait for their turn on an asyncio event loop running in a
+    background thread, so waiting does not hold a connection.  Only the
+    http request itself runs on one of the `max_connections` threads.
+    Has the same `add_request`/`retrieve_completed` surface as
+    `RequestQueue`.
+    """
+    def __init__(self, 
+                 rate=1.0, 
+                 burst=1, 
+                 max_connections=10, 
+                 cache=None, 
+                 max_backlog=None,
+                 metrics=None,
+                 seen=None):
+        """
+        rate: [float] requests per second allowed for each host
+        burst: [int] number of requests that can be sent at once to a host
+            after it has been idle
+        max_connections: [int] size of the http connection pool
+        cache: [PageCache] pages are served from the cache when possible,
+            and successful responses are added to it.
+        max_backlog, metrics, seen: see `RequestQueue`
+        """
+        super().__init__(
+            pool_size=max_connections, 
+            delay=0, 
+            cache=cache, 
+            max_backlog=max_backlog,
+            metrics=metrics,
+            seen=seen
+        )
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self._n_fetching = 0
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever,
+            name='AsyncRequestQueue',
+            daemon=True
+        )
+        self._thread.start()
+
+    def __repr__(self):
+        r = (
+            f'<AsyncRequestQueue {len(self.futures)} requests, '
+            f'{self.rate}/s per host at 0x{id(self):x}>'
+        )
+        return r
+
+    def bucket(self, url):
+        """
+        Returns the token bucket for the host of `url`.
+        """
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def _fetch(self, url, kind='url'):
+        await self.bucket(url).acquire()
+        request = partial(self._request, url, kind)
+        self._n_fetching += 1
+        try:
+            res = await self.loop.run_in_executor(self.thread_pool, request)
+        finally:
+            self._n_fetching -= 1
+        return self._store(url, res)
+
+    def _submit(self, url, kind='url'):
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, kind), self.loop)
+
+    @property
+    def status(self):
+        d = super().status
+        d['FETCHING'] = self._n_fetching
+        d['FREE'] = self.pool_size - self._n_fetching
+        return d
+
+    def close(self):
+        """
+        Stops the event loop and the connection threads.
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.thread_pool.shutdown()
+        self.http_pool.clear()
@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+from time import time
+
+
+class PageCache:
+    """
+    Disk backed cache of page content keyed by URL.  Entries expire after
+    `ttl` seconds and the least recently used entries are evicted when the
+    cache grows past `max_bytes`.
+
+    The cache is a single SQLite file, so it can be shared between the
+    `FirefoxSession` and the threads of a `RequestQueue`.
+    """
+    def __init__(self, path='scholar_cache.sqlite', ttl=7*24*3600,
+                 max_bytes=2**30):
+        """
+        path: [str] location of the cache file
+        ttl: [float] seconds an entry stays valid, None to never expire
+        max_bytes: [int] total size of the cached content before the least
+            recently used entries are evicted, None for no limit
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'url TEXT PRIMARY KEY, content BLOB, size INTEGER, '
+            'stored REAL, accessed REAL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)'
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM pages'
+        ).fetchone()[0]
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return (f'<{n} {len(self)} pages, {self._size} bytes, '
+                f'{self.hits} hits / {self.misses} misses at 0x{id(self):x}>')
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def __contains__(self, url):
+        return self.get(url, _count=False) is not None
+
+    def get(self, url, _count=True):
+        """
+        Returns the cached content of `url` as bytes, or None when the url
+        is not cached or has expired.
+        """
+        now = time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT content, stored FROM pages WHERE url=?', (url,)
+            ).fetchone()
+            if row is None:
+                if _count:
+                    self.misses += 1
+                return None
+            content, stored = row
+            if self.ttl is not None and now - stored > self.ttl:
+                self._delete(url)
+                self._conn.commit()
+                if _count:
+                    self.expired += 1
+                    self.misses += 1
+                return None
+            self._conn.execute(
+                'UPDATE pages SET accessed=? WHERE url=?', (now, url)
+            )
+            self._conn.commit()
+            if _count:
+                self.hits += 1
+        return bytes(content)
+
+    def set(self, url, content):
+        """
+        Stores `content` for `url`, evicting the least recently used pages
+        if the cache is over its size limit.
+
+        content: [bytes, str] the page content, str is stored as utf-8
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        now = time()
+        with self._lock:
+            self._delete(url)
+            self._conn.execute(
+                'INSERT INTO pages VALUES (?, ?, ?, ?, ?)',
+                (url, content, len(content), now, now)
+            )
+            self._size += len(content)
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, url):
+        row = self._conn.execute(
+            'SELECT size FROM pages WHERE url=?', (url,)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute('DELETE FROM pages WHERE url=?', (url,))
+            self._size -= row[0]
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                'SELECT url, size FROM pages ORDER BY accessed LIMIT 64'
+            ).fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._conn.execute('DELETE FROM pages WHERE url=?', (url,))
+                self._size -= size
+                self.evictions += 1
+
+    def purge_expired(self):
+        """
+        Removes all expired entries from the cache file.
+        """
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cutoff = time() - self.ttl
+            n, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages '
+                'WHERE stored < ?', (cutoff,)
+            ).fetchone()
+            self._conn.execute('DELETE FROM pages WHERE stored < ?', (cutoff,))
+            self._conn.commit()
+            self._size -= size
+            self.expired += n
+        return n
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM pages')
+            self._conn.commit()
+            self._size = 0
+
+    @property
+    def stats(self):
+        """
+        Hit/miss counts for this session of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes': self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedHTTPResponse:
+    """
+    Stands in for a urllib3 response when the page is served from the cache.
+    """
+    status = 200
+
+    def __init__(self, url, data):
+        self.url = url
+        self.data = data
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.url}>'
+
+    def geturl(self):
+        return self.url
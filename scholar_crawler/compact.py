@@ -0,0 +1,311 @@
+from array import array
+from itertools import combinations
+import numpy as np
+
+
+class CompactGraph:
+    """
+    Memory efficient co-authorship graph.  Author and document ids are
+    interned to integers, the edges are kept in a growable buffer of int32
+    (node, node, doc) triples, and the co-author adjacency is a CSR array
+    pair, updated with the edges added since it was last queried.
+
+    Converts to and from `AuthorGraph` and `graphs.Graph`.
+    """
+    def __init__(self):
+        # node id <-> node index
+        self.ids = []
+        self.index = {}
+        # document id <-> document index
+        self.doc_ids = []
+        self.doc_index = {}
+        # optional attribute rows, without the id, by index
+        self.node_attrs = []
+        self.doc_attrs = []
+        self.node_header = None
+        self.doc_header = None
+        # flat node, node, doc triples
+        self._edges = array('i')
+        self._csr = None
+        # length of the edge buffer covered by `_csr`
+        self._csr_edges = 0
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return (f'<{n} {len(self.ids)} nodes, {self.n_edges} edges '
+                f'at 0x{id(self):x}>')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        return node_id in self.index
+
+    @property
+    def n_edges(self):
+        return len(self._edges) // 3
+
+    @property
+    def nbytes(self):
+        """
+        Bytes used by the edge buffer and the adjacency arrays.
+        """
+        n = self._edges.itemsize * len(self._edges)
+        if self._csr is not None:
+            n += sum(a.nbytes for a in self._csr)
+        return n
+
+    def add_node(self, node_id, attrs=None):
+        """
+        Returns the index of `node_id`, adding the node if it is new.
+
+        attrs: [tuple] attributes of the node, replaces the current ones
+        """
+        i = self.index.get(node_id)
+        if i is None:
+            i = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            self.node_attrs.append(attrs)
+        elif attrs is not None:
+            self.node_attrs[i] = attrs
+        return i
+
+    def add_doc(self, doc_id, attrs=None):
+        """
+        Returns the index of `doc_id`, adding the document if it is new.
+        """
+        i = self.doc_index.get(doc_id)
+        if i is None:
+            i = self.doc_index[doc_id] = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self.doc_attrs.append(attrs)
+        elif attrs is not None:
+            self.doc_attrs[i] = attrs
+        return i
+
+    def add_edge(self, node1_id, node2_id, doc_id):
+        self._edges.extend((
+            self.add_node(node1_id),
+            self.add_node(node2_id),
+            self.add_doc(doc_id)
+        ))
+
+    def add_document(self, doc_id, node_ids, attrs=None):
+        """
+        Adds an edge between each pair of `node_ids` for the document.
+        """
+        d = self.add_doc(doc_id, attrs)
+        nodes = [self.add_node(n) for n in node_ids]
+        edges = self._edges
+        for a1, a2 in combinations(nodes, 2):
+            edges.extend((a1, a2, d))
+
+    def extend(self, edge_list):
+        """
+        Adds the node, node, doc_id rows of `edge_list`.
+        """
+        add_node = self.add_node
+        add_doc = self.add_doc
+        self._edges.extend(
+            i
+            for n1, n2, d in edge_list
+            for i in (add_node(n1), add_node(n2), add_doc(d))
+        )
+
+    def edge_array(self):
+        """
+        Returns a copy of the edges as an (n, 3) int32 array of node, node,
+        doc indices.
+        """
+        return np.array(self._edges, dtype=np.int32).reshape(-1, 3)
+
+    def csr(self):
+        """
+        Returns the (indptr, indices) CSR arrays of the co-author adjacency.
+        The co-authors of node `i` are `indices[indptr[i]:indptr[i + 1]]`,
+        sorted and without duplicates.
+        """
+        csr = self._csr
+        if (csr is None or self._csr_edges < len(self._edges)
+                or len(csr[0]) != len(self.ids) + 1):
+            self._csr = self._update_csr()
+        return self._csr
+
+    def _update_csr(self):
+        # the adjacency is kept as sorted unique row * n + col keys, the
+        # edges added since the last update are inserted into the keys of
+        # the current arrays instead of rebuilding them from every edge
+        n = len(self.ids)
+        edges = np.array(self._edges[self._csr_edges:], dtype=np.int64)
+        edges = edges.reshape(-1, 3)
+        src = np.concatenate([edges[:, 0], edges[:, 1]])
+        dst = np.concatenate([edges[:, 1], edges[:, 0]])
+        keep = src != dst
+        new = np.unique(src[keep] * n + dst[keep])
+        if self._csr is not None:
+            indptr, indices = self._csr
+            rows = np.repeat(
+                np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr)
+            )
+            old = rows * n + indices
+            pos = np.searchsorted(old, new)
+            found = pos < len(old)
+            found[found] = old[pos[found]] == new[found]
+            new = np.insert(old, pos[~found], new[~found])
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(new // n, minlength=n), out=indptr[1:])
+        indices = (new % n).astype(np.int32)
+        self._csr_edges = len(self._edges)
+        return indptr, indices
+
+    def neighbor_indices(self, i):
+        indptr, indices = self.csr()
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def neighbors(self, node_id):
+        """
+        Returns the ids of the co-authors of `node_id`.
+        """
+        i = self.index.get(node_id)
+        if i is None:
+            return []
+        ids = self.ids
+        return [ids[j] for j in self.neighbor_indices(i).tolist()]
+
+    def degree(self, node_id):
+        i = self.index.get(node_id)
+        if i is None:
+            return 0
+        indptr, _ = self.csr()
+        return int(indptr[i + 1] - indptr[i])
+
+    def degrees(self):
+        """
+        Returns the degree of every node as an array.
+        """
+        indptr, _ = self.csr()
+        return np.diff(indptr)
+
+    def edge_list(self):
+        """
+        Yields the edges as node id, node id, doc id, in the order they
+        were added.
+        """
+        ids = self.ids
+        doc_ids = self.doc_ids
+        it = iter(self._edges.tolist())
+        for a1, a2, d in zip(it, it, it):
+            yield ids[a1], ids[a2], doc_ids[d]
+
+    def node_rows(self):
+        """
+        Yields the id and attributes of the nodes with attributes.
+        """
+        for node_id, attrs in zip(self.ids, self.node_attrs):
+            if attrs is not None:
+                yield (node_id,) + tuple(attrs)
+
+    def doc_rows(self):
+        """
+        Yields the id and attributes of the documents with attributes.
+        """
+        for doc_id, attrs in zip(self.doc_ids, self.doc_attrs):
+            if attrs is not None:
+                yield (doc_id,) + tuple(attrs)
+
+    @classmethod
+    def from_rows(cls, edge_rows, node_rows=(), doc_rows=(), header=False):
+        """
+        Builds a graph from iterables of rows.  The first column of the
+        node and document rows is the id, the rest are kept as attributes.
+
+        edge_rows: [iterable] of node id, node id, doc id
+        node_rows: [iterable] of node id, attributes...
+        doc_rows: [iterable] of doc id, attributes...
+        header: [bool] the first row of each iterable is a header
+        """
+        cg = cls()
+        edge_rows, node_rows, doc_rows = map(iter, (edge_rows, node_rows, doc_rows))
+        if header:
+            next(edge_rows, None)
+            cg.node_header = next(node_rows, None)
+            cg.doc_header = next(doc_rows, None)
+        for row in node_rows:
+            cg.add_node(row[0], tuple(row[1:]))
+        for row in doc_rows:
+            cg.add_doc(row[0], tuple(row[1:]))
+        cg.extend(edge_rows)
+        return cg
+
+    @classmethod
+    def from_author_graph(cls, author_graph):
+        return cls.from_rows(
+            author_graph.generate_edge_list(True),
+            author_graph.generate_node_attrs(True),
+            author_graph.generate_edge_attrs(True),
+            header=True
+        )
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds a compact graph from a `graphs.Graph`.
+        """
+        return cls.from_rows(
+            graph.edge_list(),
+            graph.node_attributes(),
+            graph.edge_attributes(),
+            header=True
+        )
+
+    def to_author_graph(self, merge_no_id_authors=False):
+        """
+        Returns the graph as an `AuthorGraph`, which needs the node and
+        document attributes of `from_author_graph`.
+        """
+        from .graph import AuthorGraph
+        return AuthorGraph.from_egde_list(
+            self.edge_list(),
+            node_attrs=self.node_rows(),
+            edge_attrs=self.doc_rows(),
+            merge_no_id_authors=merge_no_id_authors
+        )
+
+    def to_graph(self):
+        """
+        Returns the graph as a `graphs.Graph`, which needs the node and
+        document attributes of `from_graph`.  Without a document header the
+        attributes are taken in the column order of `Graph.edge_attributes`.
+        Coauthors with a single word name are dropped, as `Graph` does.
+        """
+        from graphs.graphs import Author, Document, Graph
+
+        g = Graph()
+        for node_id, name, _, parent_id in self.node_rows():
+            # like `Document`, drop coauthors with a single word name
+            if parent_id and ' ' not in name:
+                continue
+            g.register_author(Author(name, node_id, parent_id or None), node_id)
+            # authors added with `add_author` have no parent
+            if not parent_id:
+                g.authors[node_id]
+
+        members = [set() for _ in self.doc_ids]
+        it = iter(self._edges.tolist())
+        for a1, a2, d in zip(it, it, it):
+            members[d].update((a1, a2))
+
+        header = self.doc_header or next(g.edge_attributes())
+        fields = header[1:]
+        for doc_id, attrs, nodes in zip(self.doc_ids, self.doc_attrs, members):
+            if attrs is None:
+                continue
+            d_dict = dict(zip(fields, attrs))
+            node_ids = {self.ids[i] for i in nodes} & g.author_ids.keys()
+            names = [g.author_ids[a].name for a in node_ids]
+            doc = Document(authors=names, **d_dict)
+            doc.doc_id = doc_id
+            parent = d_dict['parent_author']
+            g.authors[parent].update(node_ids - {parent})
+            g.documents[doc] = node_ids
+        return g
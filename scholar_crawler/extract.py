@@ -0,0 +1,79 @@
+import re
+from urllib.parse import unquote_plus
+from lxml import etree
+
+# XPath expressions and regexes used by the parsers in `requests.py`, they
+# are compiled once here instead of on every parse.
+
+# author search results
+AUTHOR_LINKS = etree.XPath('//div[@class="gs_ai_t"]/h3/a')
+NEXT_BUTTON = etree.XPath('//button[contains(@class, "gs_btnPR") and @onclick]')
+
+# author profile
+PROFILE_NAME = etree.XPath('//div[@id="gsc_prf_in"]')
+PROFILE_TITLE = etree.XPath('//div[@class="gsc_prf_il"]')
+PROFILE_INSTITUTION = etree.XPath('//a[@class="gsc_prf_ila"]')
+PROFILE_EMAIL = etree.XPath('//div[@id="gsc_prf_ivh"]')
+PROFILE_INTERESTS = etree.XPath('//div[@id="gsc_prf_int"]/a/text()')
+PUBLICATION_LINKS = etree.XPath('//td[@class="gsc_a_t"]/a')
+
+# title search results
+DOCUMENT_DIVS = etree.XPath('//div[@data-did]')
+DOCUMENT_TITLE = etree.XPath('.//h3/a/text()|.//h3/a/svg/@aria-label')
+DOCUMENT_AUTHOR_TEXT = etree.XPath('.//div[@class="gs_a"]/text()')
+DOCUMENT_AUTHOR_LINKS = etree.XPath('.//div[@class="gs_a"]/a')
+
+TEXT = etree.XPath('./text()')
+
+USER_RE = re.compile(r'(?:^|[?&;])user=([^&#]*)')
+# characters that are not kept in the title fragments searched for
+TITLE_SPLIT_RE = re.compile(r'[^A-Za-z0-9;:" \[\]{},\.\-]+')
+
+
+def user_id(url, default=''):
+    """
+    Returns the value of the `user` query parameter of `url`.
+    """
+    m = USER_RE.search(url)
+    if m is None:
+        return default
+    return unquote_plus(m.group(1))
+
+
+def first_text(xpath, h, default=''):
+    """
+    Returns the text content of the first element matched by `xpath`.
+    """
+    found = xpath(h)
+    if found:
+        return found[0].text_content()
+    return default
+
+
+def title_fragments(a):
+    """
+    Splits the title of the publication link `a` into the fragments that
+    are searched for.  Titles are split around characters that the title
+    search does not handle, and fragments of 2 characters or less dropped.
+    """
+    out = []
+    for t in TEXT(a):
+        frag = t.strip(' -\xa0\u2026')
+        for f in TITLE_SPLIT_RE.split(frag):
+            f = f.strip()
+            if len(f) > 2:
+                out.append(f)
+    return out
+
+
+def document_authors_text(div):
+    """
+    Returns the names of the authors of a title search result that do not
+    link to a profile.
+    """
+    # \u2026 is ellipsis dots
+    return [
+        n
+        for a in DOCUMENT_AUTHOR_TEXT(div)
+        for n in a.split('\xa0')[0].strip('\u2026').split(', ')
+    ]
@@ -1,3 +1,5 @@
+import re
+from time import sleep
 from selenium import webdriver
 from lxml import html
 try:
@@ -5,16 +7,63 @@ try:
 except ImportError:
     win32gui = type('win32gui', (), {'__file__': None})
 
+# text shown by Google when it has detected that we are scraping
+ROBOT_MESSAGES = (
+    'Our systems have detected unusual traffic from your computer network',
+    "Please show you're not a robot",
+    "Sorry, we can't verify that you're not a robot",
+    "really you sending the requests, and not a robot"
+)
+
+
+# all of the messages in one pattern, so a page is scanned only once
+_ROBOT_RE = re.compile('|'.join(re.escape(m) for m in ROBOT_MESSAGES))
+_ROBOT_RE_BYTES = re.compile(_ROBOT_RE.pattern.encode('utf-8'))
+
+
+def is_robot_page(content):
+    """
+    Checks the page `content` for Google's robot detection messages.
+
+    content: [str, bytes] the page source
+    """
+    if isinstance(content, bytes):
+        return _ROBOT_RE_BYTES.search(content) is not None
+    return _ROBOT_RE.search(content) is not None
+
+
 class FirefoxSession:
     """
     Wrapper for selenium driver that acts like a HTTP session
     """
-    def __init__(self):
-        self.driver = webdriver.Firefox()
+    def __init__(self, cache=None, headless=False, driver=None):
+        """
+        cache: [PageCache] pages are served from the cache when possible,
+            and fetched pages are added to it.
+        headless: [bool] run Firefox without a window.  Captchas can't be
+            solved in a headless session.
+        driver: [WebDriver] driver to use instead of starting Firefox, e.g.
+            a `StubDriver`
+        """
+        if driver is None:
+            options = webdriver.FirefoxOptions()
+            if headless:
+                options.add_argument('-headless')
+            driver = webdriver.Firefox(options=options)
+        self.driver = driver
+        self.headless = headless
+        self.cache = cache
 
     def get(self, url):
+        if self.cache is not None:
+            content = self.cache.get(url)
+            if content is not None:
+                return Response(url, content)
         self.driver.get(url)
-        return self.current_response
+        response = self.current_response
+        if self.cache is not None and not response.is_robot:
+            self.cache.set(url, response.content)
+        return response
 
     @property
     def current_response(self):
@@ -24,6 +73,14 @@ class FirefoxSession:
     def url(self):
         return self.driver.current_url
 
+    @property
+    def cookies(self):
+        return self.driver.get_cookies()
+
+    @property
+    def user_agent(self):
+        return self.driver.execute_script('return navigator.userAgent')
+
     def close(self):
         self.driver.close()
 
@@ -93,17 +150,104 @@ class FirefoxSession:
         win32gui.ShowWindow(hwnd, cmd_show)  # pylint: disable=no-member
         win32gui.SetForegroundWindow(hwnd)   # pylint: disable=no-member
 
+
+class StubDriver:
+    """
+    Stands in for the selenium Firefox driver without a browser, so the
+    sessions and the code driving them can be tested offline.
+    """
+    def __init__(self, pages=None, latency=0, user_agent='StubDriver/1.0'):
+        """
+        pages: [dict, callable] page source of each url, or a function
+            returning the page source of a url.  Unknown urls load an empty
+            page.
+        latency: [float] seconds each page load takes
+        user_agent: [str] returned for `navigator.userAgent`
+        """
+        self.pages = pages or {}
+        self.latency = latency
+        self.user_agent = user_agent
+        self.current_url = 'about:blank'
+        self.page_source = '<html><head></head><body></body></html>'
+        self.title = ''
+        self.n_gets = 0
+
+    def get(self, url):
+        if self.latency:
+            sleep(self.latency)
+        self.n_gets += 1
+        if callable(self.pages):
+            source = self.pages(url)
+        else:
+            source = self.pages.get(url)
+        self.current_url = url
+        if source is not None:
+            self.page_source = source
+        else:
+            self.page_source = '<html><head></head><body></body></html>'
+
+    def get_cookies(self):
+        return []
+
+    def execute_script(self, script, *args):
+        if 'userAgent' in script:
+            return self.user_agent
+        return None
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+    def minimize_window(self):
+        pass
+
+    def maximize_window(self):
+        pass
+
+
+class _HTML:
+    __slots__ = ('lxml',)
+
+    def __init__(self, lxml):
+        self.lxml = lxml
+
+
 class Response:
     """
-    Mimics an HTTP response object.
+    Mimics an HTTP response object.  The content is only parsed when the
+    `lxml` or `html` attributes are first used.
     """
-    def __init__(self, url, content):
+    def __init__(self, url, content, status=200):
+        """
+        url: [str] url of the page
+        content: [str, bytes] the page source
+        status: [int] http status of the page
+        """
         self.url = url
         self.content = content
-        self.lxml = html.fromstring(content)
+        self.status = status
+        self._html = None
+        self._is_robot = None
+
+    @property
+    def lxml(self):
+        return self.html.lxml
 
     @property
     def html(self):
-        HTML = type('html', (), {'lxml': self.lxml})
-        HTML.lxml.url = self.url
-        return HTML
\ No newline at end of file
+        if self._html is None:
+            h = html.fromstring(self.content)
+            h.url = self.url
+            self._html = _HTML(h)
+        return self._html
+
+    @property
+    def is_robot(self):
+        """
+        True when the page is one of Google's robot checks.
+        """
+        if self._is_robot is None:
+            self._is_robot = is_robot_page(self.content)
+        return self._is_robot
\ No newline at end of file
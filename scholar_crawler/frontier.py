@@ -0,0 +1,213 @@
+import heapq
+from collections import Counter, defaultdict
+from itertools import count
+
+
+def request_key(request):
+    """
+    Returns the key used to decide whether two requests are equivalent.
+    Requests may define a `key` attribute, otherwise the request type and
+    url are used.
+    """
+    key = getattr(request, 'key', None)
+    if key is None:
+        key = (request._name, request.request_url)
+    return key
+
+
+class HopPriority:
+    """
+    Breadth-first ordering: requests with fewer hops are fetched first.
+    """
+    def __call__(self, request):
+        return (request.hop,)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}>'
+
+
+class TypePriority:
+    """
+    Orders requests by their type, then by hop.
+
+    order: [list] request type names, earliest first.  Types not in the
+        list are fetched last.
+    """
+    ORDER = ('AuthorSearch', 'Author', 'TitleSearch')
+
+    def __init__(self, order=None):
+        self.order = tuple(order or self.ORDER)
+        self._rank = {name: i for i, name in enumerate(self.order)}
+
+    def __call__(self, request):
+        return (self._rank.get(request._name, len(self.order)), request.hop)
+
+    def __repr__(self):
+        order = ' > '.join(self.order)
+        return f'<{self.__class__.__name__} {order}>'
+
+
+class YieldPriority:
+    """
+    Orders requests by the number of new authors that requests of the same
+    type (and parent author, for title searches) have produced so far.
+    Requests that are expected to find more new authors are fetched first.
+    The `Frontier` re-ranks a queued request when it is popped, so requests
+    of groups that turned out to find fewer authors fall back in the queue.
+
+    prior: [float] the expected yield for requests that have no history.
+        A high prior makes the frontier try unexplored parents early.
+    weight: [float] pseudo-count given to the prior when averaging.
+    """
+    def __init__(self, prior=1.0, weight=1.0):
+        self.prior = prior
+        self.weight = weight
+        self._totals = defaultdict(float)
+        self._counts = defaultdict(int)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} prior={self.prior}>'
+
+    @staticmethod
+    def _group(request):
+        parent = getattr(request, 'parent_author', None)
+        if parent is not None:
+            return (request._name, parent.author_id or parent.name)
+        return (request._name, None)
+
+    def expected_yield(self, request):
+        """
+        Returns the smoothed mean of new authors found per request of the
+        same group.
+        """
+        g = self._group(request)
+        total = self._totals[g] + self.prior * self.weight
+        return total / (self._counts[g] + self.weight)
+
+    def observe(self, request, n_new):
+        """
+        Records that `request` produced `n_new` authors new to the graph.
+        """
+        g = self._group(request)
+        self._totals[g] += n_new
+        self._counts[g] += 1
+
+    def __call__(self, request):
+        return (-self.expected_yield(request), request.hop)
+
+
+class Frontier:
+    """
+    Priority queue of pending requests.  Requests that are equivalent to
+    one already queued are coalesced into the queued request.
+
+    policy: [callable] takes a request and returns a sortable priority,
+        lowest is fetched first.  Defaults to `HopPriority`.  Requests with
+        equal priority are fetched in the order they were added.  When the
+        policy learns from `observe`, the priority of a request is checked
+        again when it is popped, and the request is put back if it got
+        worse.  Priorities that got better only apply to the requests
+        queued after the change.
+    """
+    def __init__(self, policy=None):
+        self.policy = policy or HopPriority()
+        self._heap = []
+        self._entries = {}
+        self._counter = count()
+        self.n_added = 0
+        self.n_coalesced = 0
+        self.n_reranked = 0
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {len(self)} requests, policy={self.policy!r}>'
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __contains__(self, request):
+        return request_key(request) in self._entries
+
+    def __iter__(self):
+        """
+        Iterates over the pending requests, in no particular order.
+        """
+        return (entry[2] for entry in self._entries.values())
+
+    def append(self, request):
+        """
+        Adds `request` to the frontier.  If an equivalent request is already
+        queued, the better of the two priorities is kept and the request is
+        counted as coalesced.
+
+        return: [bool] True when the request was queued as a new entry
+        """
+        self.n_added += 1
+        key = request_key(request)
+        priority = self.policy(request)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.n_coalesced += 1
+            if priority < entry[0]:
+                # re-queue the existing request with the better priority,
+                # the stale heap entry is skipped when popped
+                entry[3] = False
+                self._push(key, priority, entry[2], request)
+            return False
+        self._push(key, priority, request)
+        return True
+
+    def extend(self, requests):
+        for request in requests:
+            self.append(request)
+
+    def _push(self, key, priority, request, ranked=None):
+        # ranked is the request the priority was computed from
+        entry = [priority, next(self._counter), request, True, key,
+                 request if ranked is None else ranked]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def pop(self):
+        """
+        Removes and returns the request with the lowest priority value.
+        """
+        learns = getattr(self.policy, 'observe', None) is not None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if not entry[3]:
+                continue
+            if learns:
+                # drop the stale entries so the next live one is compared
+                while self._heap and not self._heap[0][3]:
+                    heapq.heappop(self._heap)
+            if learns and self._heap:
+                # the policy may have learned since the request was queued,
+                # put it back if it no longer comes first
+                priority = self.policy(entry[5])
+                if priority > entry[0] and priority > self._heap[0][0]:
+                    self.n_reranked += 1
+                    entry[0] = priority
+                    heapq.heappush(self._heap, entry)
+                    continue
+            del self._entries[entry[4]]
+            return entry[2]
+        raise IndexError('pop from an empty frontier')
+
+    def observe(self, request, n_new):
+        """
+        Passes the number of new authors found by `request` to the policy,
+        if the policy learns from it.
+        """
+        observe = getattr(self.policy, 'observe', None)
+        if observe is not None:
+            observe(request, n_new)
+
+    def counts(self):
+        """
+        Returns the number of pending requests of each type.
+        """
+        return Counter(request._name for request in self)
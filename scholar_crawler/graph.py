@@ -1,9 +1,14 @@
 import zipfile
 import csv
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from io import TextIOWrapper
+from shutil import copyfileobj
+from tempfile import TemporaryFile
 from collections import defaultdict
-from itertools import combinations
+from itertools import combinations, groupby
+from operator import itemgetter
 from random import choices
+from .requests import Author, Document
 
 
 class AuthorGraph:
@@ -20,8 +25,14 @@ class AuthorGraph:
             with no profile will be merged.
         """
         self.merge_no_id_authors = merge_no_id_authors
-        self.nodes = defaultdict(list)
+        # author -> documents, dicts are used as insertion ordered sets
+        self.nodes = defaultdict(dict)
+        # document -> list of authors, in the order they were added
         self.edges = {}
+        # document -> set of authors, for membership checks
+        self.edge_members = {}
+        # author -> co-authors, as an ordered set
+        self.coauthors = defaultdict(dict)
         self.request_queue = None
 
     def __repr__(self):
@@ -40,17 +51,21 @@ class AuthorGraph:
         ### ADD EDGE
         # add the parent_author to the author list if it is not already there
         if doc in self.edges:
-            current_authors = self.edges.get(doc, [])
-            if doc.parent_author not in current_authors:
-                current_authors.append(doc.parent_author)
-                new_authors.append(doc.parent_author)
+            parent = doc.parent_author
+            members = self.edge_members[doc]
+            if parent not in members:
+                current_authors = self.edges[doc]
+                self._link(parent, current_authors)
+                current_authors.append(parent)
+                members.add(parent)
+                new_authors.append(parent)
             # add paper to node's values
-            if doc not in self.nodes[doc.parent_author]:
-                self.nodes[doc.parent_author].append(doc)
+            self.nodes[parent][doc] = None
             return new_authors
         
         # the entire paper
         self.edges[doc] = doc.authors
+        self.edge_members[doc] = set()
         # update the nodes' papers
         for author in doc.authors:
             # if not merging authors, randomize the author ids
@@ -59,16 +74,60 @@ class AuthorGraph:
             # track authors that are new to the graph
             if author not in self.nodes:
                 new_authors.append(author)
-            # append to each author node's list
-            self.nodes[author].append(doc)
+            # add to each author node's documents
+            self.nodes[author][doc] = None
+        self._index_edge(doc)
         return new_authors
-        
+
+    def _index_edge(self, doc):
+        """
+        Adds the authors of the edge `doc` to the membership and co-author
+        indexes.
+        """
+        members = self.edge_members[doc]
+        linked = []
+        for author in self.edges[doc]:
+            if author not in members:
+                self._link(author, linked)
+                members.add(author)
+                linked.append(author)
+
+    def _link(self, author, others):
+        """
+        Records `author` as a co-author of each of `others`.
+        """
+        coauthors = self.coauthors[author]
+        for other in others:
+            if other != author:
+                coauthors[other] = None
+                self.coauthors[other][author] = None
+
+    def documents(self, author):
+        """
+        Returns the documents of `author`, in the order they were added.
+        """
+        return list(self.nodes.get(author, ()))
+
+    def neighbors(self, author):
+        """
+        Returns the co-authors of `author`, in the order they were added.
+        """
+        return list(self.coauthors.get(author, ()))
+
+    def degree(self, author):
+        return len(self.coauthors.get(author, ()))
+
     def get_node_id(self, node):
         """
         Returns the node's id when exported.
         """
         if self.merge_no_id_authors:
             return node.name + ':' + node.author_id
+        if node.author_id.startswith('#'):
+            # authors without a profile that are the same node can hold
+            # different random ids, see `randomize_empty_id`, so the node is
+            # named after the key they share
+            return f'#{hash(node):x}'
         return node.author_id
 
     def generate_edge_list(self, header=False):
@@ -126,55 +185,219 @@ class AuthorGraph:
                 '|'.join(node.interests)
             )
 
-    def export(self, path):
+    def export(self, 
+               path, 
+               compression=zipfile.ZIP_DEFLATED, 
+               compresslevel=None,
+               parallel=False):
         """
         Saves the graph to a zip file containing 3 csv files:
         - edge_list.csv : the node to node connnections
         - edge_attrs.csv : the edges attributes
         - node_attrs.csv : the node attributes
+
+        The rows are streamed into the compressed zip members, so memory use
+        does not grow with the size of the graph.
+
+        compression: [int] zipfile compression method
+        compresslevel: [int] compression level, see `zipfile.ZipFile`
+        parallel: [bool] write the 3 csv files to temporary files in
+            separate threads, then compress them into the zip file
         """
         if not path.lower().endswith('.zip'):
             path = path + '.zip' 
-        archive = zipfile.ZipFile(path, 'w')
-
-        with StringIO() as fp:
-            writer = csv.writer(fp)
-            for row in self.generate_edge_list(True):
-                writer.writerow(row)
-            archive.writestr('edge_list.csv', fp.getvalue())
-
-        with StringIO() as fp:
-            writer = csv.writer(fp)
-            for row in self.generate_edge_attrs(True):
-                writer.writerow(row)
-            archive.writestr('edge_attrs.csv', fp.getvalue())
-
-        with StringIO() as fp:
-            writer = csv.writer(fp)
-            for row in self.generate_node_attrs(True):
-                writer.writerow(row)
-            archive.writestr('node_attrs.csv', fp.getvalue())
-
-        archive.close()
+        members = [
+            ('edge_list.csv', self.generate_edge_list),
+            ('edge_attrs.csv', self.generate_edge_attrs),
+            ('node_attrs.csv', self.generate_node_attrs),
+        ]
+        archive = zipfile.ZipFile(
+            path, 'w', compression, compresslevel=compresslevel
+        )
+        with archive:
+            if parallel:
+                self._export_parallel(archive, members)
+            else:
+                for name, rows in members:
+                    with archive.open(name, 'w', force_zip64=True) as fp:
+                        self._write_csv(fp, rows(True))
         return archive
 
+    @staticmethod
+    def _write_csv(fp, rows):
+        """
+        Writes `rows` as csv to the binary file `fp`.
+        """
+        text = TextIOWrapper(fp, encoding='utf-8', newline='')
+        csv.writer(text).writerows(rows)
+        text.flush()
+        text.detach()
+
+    def _export_parallel(self, archive, members):
+        def render(rows):
+            tmp = TemporaryFile()
+            self._write_csv(tmp, rows(True))
+            tmp.seek(0)
+            return tmp
+
+        with ThreadPoolExecutor(len(members)) as pool:
+            futures = [(name, pool.submit(render, rows)) for name, rows in members]
+            for name, f in futures:
+                with f.result() as tmp, archive.open(name, 'w', force_zip64=True) as fp:
+                    copyfileobj(tmp, fp, 2**20)
+
+    @classmethod
+    def from_egde_list(cls, 
+                       edge_list, 
+                       node_attrs=None, 
+                       edge_attrs=None, 
+                       merge_no_id_authors=False):
+        """
+        Creates a new AuthorGraph from the iterable `edge_list`.  Rows are
+        consumed as they come, the rows of a document are expected to be
+        consecutive, as `generate_edge_list` writes them.
+
+        edge_list: [iterable] of author, author, doc_id
+        node_attrs: [iterable] rows of `generate_node_attrs`, without the
+            header, used to rebuild the authors
+        edge_attrs: [iterable] rows of `generate_edge_attrs`, without the
+            header, used for the document titles
+        merge_no_id_authors: [bool] see `AuthorGraph`
+        """
+        ag = cls(merge_no_id_authors)
+        authors = {}
+        for row in node_attrs or ():
+            author = ag._author_from_row(row)
+            authors[row[0]] = author
+            ag.nodes[author]
+        # the documents are added first so the edges keep their order,
+        # documents with a single author have no rows in the edge list
+        docs = {}
+        for doc_id, title in edge_attrs or ():
+            doc = docs[doc_id] = Document(doc_id, title, None, [])
+            ag._add_edge(doc, [])
+
+        def get_author(node_id):
+            author = authors.get(node_id)
+            if author is None:
+                author = authors[node_id] = ag._author_from_id(node_id)
+            return author
+
+        for doc_id, rows in groupby(edge_list, itemgetter(2)):
+            doc = docs.get(doc_id)
+            if doc is None:
+                doc = docs[doc_id] = Document(doc_id, '', None, [])
+            node_ids = cls._edge_authors(list(rows))
+            ag._add_edge(doc, [get_author(n) for n in node_ids])
+        return ag
+
+    from_edge_list = from_egde_list
+
     @classmethod
-    def from_egde_list(cls, edge_list):
+    def from_export(cls, path, merge_no_id_authors=False):
+        """
+        Creates a new AuthorGraph from the zip file written by `export`.
+        The csv files are streamed from the archive.
         """
-        Creates a new AuthorGraph from the iterable `edge_list`.
+        if not path.lower().endswith('.zip'):
+            path = path + '.zip' 
+        with zipfile.ZipFile(path) as archive:
+            rows = lambda name: cls._read_csv(archive, name)
+            return cls.from_egde_list(
+                rows('edge_list.csv'),
+                node_attrs=rows('node_attrs.csv'),
+                edge_attrs=rows('edge_attrs.csv'),
+                merge_no_id_authors=merge_no_id_authors
+            )
 
-        :param edge_list: [iterable] of author, author, doc_id
+    @staticmethod
+    def _read_csv(archive, name):
         """
-        raise NotImplementedError('I will get around to this')
+        Yields the rows of the csv file `name` in `archive`, without the
+        header.
+        """
+        with archive.open(name) as fp:
+            reader = csv.reader(TextIOWrapper(fp, encoding='utf-8', newline=''))
+            next(reader, None)
+            yield from reader
+
+    @staticmethod
+    def _edge_authors(rows):
+        """
+        Returns the node ids of the authors of a document from its rows in
+        the edge list.  When the rows are all the pairs written by
+        `generate_edge_list`, the author list is rebuilt exactly, otherwise
+        the node ids are returned in the order they appear.
+        """
+        # n authors have n * (n - 1) / 2 pairs, the first n - 1 pairs are
+        # the first author with each of the others
+        n = int(((8 * len(rows) + 1) ** 0.5 + 1) / 2)
+        first = rows[0][0]
+        if n * (n - 1) // 2 == len(rows) and all(r[0] == first for r in rows[:n - 1]):
+            return [first] + [r[1] for r in rows[:n - 1]]
+        node_ids = {}
+        for n1, n2, _ in rows:
+            node_ids[n1] = None
+            node_ids[n2] = None
+        return list(node_ids)
+
+    def _add_edge(self, doc, authors):
+        """
+        Adds `authors` to the edge `doc`, creating it if needed.
+        """
+        current = self.edges.setdefault(doc, doc.authors)
+        members = self.edge_members.setdefault(doc, set())
+        for author in authors:
+            if author not in members:
+                current.append(author)
+            self.nodes[author][doc] = None
+        self._index_edge(doc)
+
+    @staticmethod
+    def _author_from_row(row):
+        """
+        Rebuilds an Author from a row of `generate_node_attrs`.
+        """
+        _, name, profile_name, author_id, full_title, institution, \
+            email_domain, interests = row
+        # random ids are assigned after the key is set, see randomize_empty_id
+        random_id = author_id.startswith('#') and name
+        author = Author(
+            name=name,
+            profile_name=profile_name,
+            author_id='' if random_id else author_id
+        )
+        author.author_id = author_id
+        author.full_title = full_title
+        author.institution = institution
+        author.email_domain = email_domain
+        author.interests = interests.split('|') if interests else []
+        return author
+
+    def _author_from_id(self, node_id):
+        """
+        Creates an Author from a node id, for authors without attributes.
+        """
+        if self.merge_no_id_authors:
+            name, _, author_id = node_id.rpartition(':')
+            return Author(name=name, author_id=author_id)
+        return Author(author_id=node_id)
 
     def copy(self):
-        ag = self.__class__() 
-        ag.nodes = self.nodes.copy()
-        ag.egdes = self.edges.copy()
+        ag = self.__class__(self.merge_no_id_authors) 
+        ag.nodes = defaultdict(dict, {a: d.copy() for a, d in self.nodes.items()})
+        ag.edges = {doc: list(a) for doc, a in self.edges.items()}
+        ag.edge_members = {doc: set(a) for doc, a in self.edge_members.items()}
+        ag.coauthors = defaultdict(dict, {a: c.copy() for a, c in self.coauthors.items()})
         return ag
 
     def __add__(self, other):
         ag = self.copy()
-        ag.nodes.update(other.nodes)
-        ag.edges.update(other.edges)
-        return ag
\ No newline at end of file
+        for node, docs in other.nodes.items():
+            ag.nodes[node].update(docs)
+        for doc, authors in other.edges.items():
+            if doc not in ag.edges:
+                ag.edges[doc] = list(authors)
+                ag.edge_members[doc] = set()
+                ag._index_edge(doc)
+        return ag
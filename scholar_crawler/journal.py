@@ -0,0 +1,172 @@
+import json
+import os
+from .requests import Document, request_from_dict
+
+
+class CrawlJournal:
+    """
+    Append-only log of the progress of a crawl.  Each line is a json
+    record of one of:
+    - push : a request was added to the frontier, with a unique id
+    - done : all of the urls of the request with the id were processed
+    - doc : a document was added to the author graph
+
+    Replaying the journal rebuilds the author graph and the requests that
+    were queued but not finished.  The journal is compacted by rewriting it
+    as the current graph and unfinished requests, which keeps resume time
+    bounded.
+    """
+    def __init__(self, path, compact_every=50000, fsync=False):
+        """
+        path: [str] location of the journal file, appended to if it exists
+        compact_every: [int] number of records written between compactions,
+            0 to never compact automatically
+        fsync: [bool] force each record to disk, survives power loss at the
+            cost of write speed
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.n_records = 0
+        # id of the next push, read from the journal when first needed
+        self._next_id = None
+        # ids of the pushes not done yet, oldest first, by request object
+        self._pending = {}
+        self._fp = open(path, 'a', encoding='utf-8')
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {self.path!r}, {self.n_records} records since compaction>'
+
+    def _write(self, record):
+        self._fp.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._fp.flush()
+        if self.fsync:
+            os.fsync(self._fp.fileno())
+        self.n_records += 1
+
+    def record_push(self, request):
+        if self._next_id is None:
+            self._next_id = self._last_id(self.path) + 1
+        push_id = self._next_id
+        self._next_id += 1
+        self._pending.setdefault(id(request), [request]).append(push_id)
+        self._write({'op': 'push', 'id': push_id, 'req': request.to_dict()})
+
+    def record_done(self, request):
+        """
+        Records that `request`, popped from the frontier, is finished.  If
+        the request was pushed more than once, its oldest push is done.
+        Requests that were not pushed to the journal are ignored.
+        """
+        ids = self._pending.get(id(request))
+        if ids is None:
+            return
+        push_id = ids.pop(1)
+        if len(ids) == 1:
+            del self._pending[id(request)]
+        self._write({'op': 'done', 'id': push_id})
+
+    @classmethod
+    def _last_id(cls, path):
+        """
+        Returns the highest push id of the journal at `path`, -1 if none.
+        """
+        last = -1
+        if os.path.exists(path):
+            for record in cls.read(path):
+                if record['op'] == 'push':
+                    last = max(last, record['id'])
+        return last
+
+    def record_document(self, doc):
+        self._write({'op': 'doc', 'doc': doc.to_dict()})
+
+    @staticmethod
+    def read(path):
+        """
+        Yields the records of the journal at `path`.  A partially written
+        last line, left by a crash, is skipped.
+        """
+        with open(path, encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    if line.endswith('\n'):
+                        raise
+                    return
+
+    @classmethod
+    def replay(cls, path, author_graph, frontier):
+        """
+        Adds the documents of the journal at `path` to `author_graph` and
+        the unfinished requests to `frontier`.
+
+        return: [int] number of records replayed
+        """
+        pending = {}
+        n = 0
+        for n, record in enumerate(cls.read(path), 1):
+            op = record['op']
+            if op == 'doc':
+                author_graph.add_publication(Document.from_dict(record['doc']))
+            elif op == 'push':
+                pending[record['id']] = request_from_dict(record['req'])
+            elif op == 'done':
+                pending.pop(record['id'], None)
+        for request in pending.values():
+            frontier.append(request)
+        return n
+
+    def maybe_compact(self, author_graph, frontier):
+        """
+        Compacts the journal if `compact_every` records have been written
+        since the last compaction.
+        """
+        if self.compact_every and self.n_records >= self.compact_every:
+            self.compact(author_graph, frontier)
+            return True
+        return False
+
+    def compact(self, author_graph, frontier):
+        """
+        Rewrites the journal as the documents of `author_graph` and the
+        requests pending in `frontier`, along with the requests popped from
+        it that are not done yet, e.g. still in flight.  The new journal
+        replaces the old one atomically, so a crash during compaction leaves
+        the old journal.
+        """
+        tmp = self.path + '.compact'
+        self._fp.close()
+        pending = {}
+        with open(tmp, 'w', encoding='utf-8') as fp:
+            for doc, authors in author_graph.edges.items():
+                d = doc.to_dict()
+                d['authors'] = [a.to_dict() for a in authors]
+                fp.write(json.dumps({'op': 'doc', 'doc': d}, separators=(',', ':')))
+                fp.write('\n')
+            # a request keeps one push per unfinished push, and at least one
+            # if it is in the frontier
+            counts = {k: (ids[0], len(ids) - 1) for k, ids in self._pending.items()}
+            for request in frontier:
+                counts.setdefault(id(request), (request, 1))
+            push_id = 0
+            for request, n in counts.values():
+                for _ in range(n):
+                    pending.setdefault(id(request), [request]).append(push_id)
+                    fp.write(json.dumps({'op': 'push', 'id': push_id,
+                                         'req': request.to_dict()},
+                                        separators=(',', ':')))
+                    fp.write('\n')
+                    push_id += 1
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, self.path)
+        self._fp = open(self.path, 'a', encoding='utf-8')
+        self._next_id = push_id
+        self._pending = pending
+        self.n_records = 0
+
+    def close(self):
+        self._fp.close()
@@ -0,0 +1,355 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic, time
+
+# Telemetry of a crawl: counters, gauges, latency histograms and event
+# rates, kept in a `Metrics` registry shared by the `ScholarQueue` and its
+# `RequestQueue`.  The registry is exported as json lines, one snapshot of
+# all the metrics per line so the file is a time series of the crawl, or as
+# a Prometheus text-format file for the node exporter's textfile collector.
+
+# upper bounds in seconds of the histogram buckets
+FETCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+WAIT_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)
+
+
+class Counter:
+    """
+    Value that only goes up.
+    """
+    kind = 'counter'
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def sample(self):
+        return {'value': self.value}
+
+
+class Gauge:
+    """
+    Value that goes up and down, e.g. the depth of a queue.
+    """
+    kind = 'gauge'
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def sample(self):
+        return {'value': self.value}
+
+
+class Histogram:
+    """
+    Distribution of observed values, counted in fixed buckets.
+    """
+    kind = 'histogram'
+
+    def __init__(self, lock, buckets=FETCH_BUCKETS):
+        """
+        buckets: [tuple] upper bounds of the buckets, values above the last
+            bound are counted in the +Inf bucket
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def cumulative(self):
+        """
+        Returns the (upper bound, count of values <= bound) pairs, the last
+        bound being '+Inf'.
+        """
+        out = []
+        n = 0
+        for bound, c in zip(self.buckets + ('+Inf',), self.counts):
+            n += c
+            out.append((bound, n))
+        return out
+
+    def sample(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': [list(b) for b in self.cumulative()],
+        }
+
+
+class Meter:
+    """
+    Counts events and their rate over the last `window` seconds.
+    """
+    kind = 'meter'
+
+    def __init__(self, lock, window=60):
+        self.window = window
+        self.total = 0
+        self.start = monotonic()
+        # [second, count] of the events in the window
+        self._seconds = deque()
+        self._lock = lock
+
+    def mark(self, n=1):
+        now = int(monotonic())
+        with self._lock:
+            self.total += n
+            if self._seconds and self._seconds[-1][0] == now:
+                self._seconds[-1][1] += n
+            else:
+                self._seconds.append([now, n])
+
+    def per_minute(self):
+        now = monotonic()
+        with self._lock:
+            while self._seconds and self._seconds[0][0] <= now - self.window:
+                self._seconds.popleft()
+            n = sum(c for _, c in self._seconds)
+        span = min(self.window, now - self.start)
+        return n * 60 / span if span > 0 else 0.0
+
+    def sample(self):
+        return {'total': self.total, 'per_minute': self.per_minute()}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prom_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + '}'
+
+
+def _prom_value(v):
+    if isinstance(v, float):
+        return repr(v) if v == v and abs(v) != float('inf') else str(v)
+    return str(v)
+
+
+class Metrics:
+    """
+    Registry of the metrics of a crawl.  Metrics are created on first use
+    and identified by their name and labels, e.g.
+    `metrics.histogram('scholar_fetch_seconds', type='Author')`.
+
+    Gauges that describe the state of an object, like the depth of a queue,
+    are set by collectors called just before each snapshot.
+    """
+    def __init__(self, path=None, fmt=None, interval=60):
+        """
+        path: [str] file written by `maybe_export`, None to only export on
+            demand
+        fmt: ['jsonl', 'prometheus'] format of `path`, by default
+            prometheus for a `.prom` file and json lines otherwise
+        interval: [float] seconds between the exports of `maybe_export`
+        """
+        self.path = path
+        if fmt is None:
+            fmt = 'prometheus' if path and path.endswith('.prom') else 'jsonl'
+        if fmt not in ('jsonl', 'prometheus'):
+            raise ValueError('fmt must be `jsonl` or `prometheus`.')
+        self.fmt = fmt
+        self.interval = interval
+        self.metrics = {}
+        self.help = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._last_export = monotonic()
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {len(self.metrics)} metrics, path={self.path!r}>'
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, _label_key(labels))
+        m = self.metrics.get(key)
+        if m is None:
+            with self._lock:
+                m = self.metrics.get(key)
+                if m is None:
+                    m = self.metrics[key] = cls(self._lock, **kwargs)
+                    self.help.setdefault(name, help or '')
+        if help and not self.help[name]:
+            self.help[name] = help
+        return m
+
+    def counter(self, name, help=None, **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help=None, **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help=None, buckets=FETCH_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def meter(self, name, help=None, window=60, **labels):
+        return self._get(Meter, name, help, labels, window=window)
+
+    @contextmanager
+    def timer(self, name, help=None, buckets=FETCH_BUCKETS, **labels):
+        """
+        Observes the seconds spent in the `with` block in the histogram
+        `name`.
+        """
+        h = self.histogram(name, help, buckets, **labels)
+        t = monotonic()
+        try:
+            yield h
+        finally:
+            h.observe(monotonic() - t)
+
+    def add_collector(self, fn):
+        """
+        fn: [callable] called with the registry before each snapshot, to
+            update gauges
+        """
+        self.collectors.append(fn)
+
+    def collect(self):
+        for fn in self.collectors:
+            fn(self)
+        return sorted(self.metrics.items(), key=lambda kv: kv[0])
+
+    def snapshot(self):
+        """
+        Returns the current value of all the metrics as a json-able dict.
+        """
+        metrics = []
+        for (name, labels), m in self.collect():
+            d = {'name': name, 'type': m.kind, 'labels': dict(labels)}
+            d.update(m.sample())
+            metrics.append(d)
+        return {'time': time(), 'metrics': metrics}
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        Meters are exposed as a `_total` counter and a `_per_minute` gauge.
+        """
+        lines = []
+        typed = set()
+
+        def header(name, kind, help):
+            if name in typed:
+                return
+            typed.add(name)
+            if help:
+                lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), m in self.collect():
+            help = self.help.get(name)
+            if m.kind == 'histogram':
+                header(name, 'histogram', help)
+                for bound, n in m.cumulative():
+                    le = bound if bound == '+Inf' else _prom_value(float(bound))
+                    lines.append(f'{name}_bucket{_prom_labels(labels, [("le", le)])} {n}')
+                lines.append(f'{name}_sum{_prom_labels(labels)} {_prom_value(m.sum)}')
+                lines.append(f'{name}_count{_prom_labels(labels)} {m.count}')
+            elif m.kind == 'meter':
+                header(f'{name}_total', 'counter', help)
+                lines.append(f'{name}_total{_prom_labels(labels)} {m.total}')
+                header(f'{name}_per_minute', 'gauge', help and f'{help} per minute')
+                lines.append(f'{name}_per_minute{_prom_labels(labels)} '
+                             f'{_prom_value(float(m.per_minute()))}')
+            else:
+                header(name, m.kind, help)
+                lines.append(f'{name}{_prom_labels(labels)} {_prom_value(m.value)}')
+        return '\n'.join(lines) + '\n'
+
+    def write_jsonl(self, path):
+        """
+        Appends a snapshot of the metrics to the json lines file `path`.
+        """
+        with open(path, 'a', encoding='utf-8') as fp:
+            fp.write(json.dumps(self.snapshot(), separators=(',', ':')) + '\n')
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics to the Prometheus text file `path`.  The file is
+        replaced atomically so a collector never reads a partial file.
+        """
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fp:
+            fp.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def export(self, path=None, fmt=None):
+        """
+        Writes the metrics to `path` in the format `fmt`, by default to the
+        `path` and format of the registry.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError('No path to export the metrics to.')
+        fmt = fmt or (self.fmt if path == self.path else
+                      'prometheus' if path.endswith('.prom') else 'jsonl')
+        if fmt == 'prometheus':
+            self.write_prometheus(path)
+        else:
+            self.write_jsonl(path)
+        self._last_export = monotonic()
+
+    def maybe_export(self):
+        """
+        Exports the metrics to `path` if `interval` seconds passed since the
+        last export.
+        """
+        if self.path and monotonic() - self._last_export >= self.interval:
+            self.export()
+            return True
+        return False
+
+    def summary(self):
+        """
+        Returns one line per metric, for status reports.
+        """
+        lines = []
+        for (name, labels), m in self.collect():
+            label = ','.join(f'{k}={v}' for k, v in labels)
+            label = f'{name}{{{label}}}' if label else name
+            if m.kind == 'histogram':
+                if m.count:
+                    lines.append(f'{label}: {m.count} in {m.sum:.2f}s '
+                                 f'({m.mean:.3f}s mean)')
+            elif m.kind == 'meter':
+                lines.append(f'{label}: {m.total} ({m.per_minute():.1f}/min)')
+            else:
+                lines.append(f'{label}: {m.value}')
+        return lines
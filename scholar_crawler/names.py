@@ -0,0 +1,59 @@
+import string
+import sys
+import unicodedata
+from functools import lru_cache
+
+# Normalization of author names.  The same names come up over and over
+# while crawling and ingesting, so the results are memoized in bounded
+# caches and interned, which also makes the equal strings share memory.
+
+CACHE_SIZE = 1 << 16
+
+
+def _shave_marks_latin(txt):
+    norm_txt = unicodedata.normalize('NFD', txt)
+    latin_base = False
+    keepers = []
+    for c in norm_txt:
+        if unicodedata.combining(c) and latin_base:
+            continue # ignore diacritic on Latin base char
+        keepers.append(c)
+        # if it isn't combining char, it's a new base char
+        if not unicodedata.combining(c):
+            latin_base = c in string.ascii_letters
+    shaved = ''.join(keepers)
+    return unicodedata.normalize('NFC', shaved)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def shave_marks_latin(txt):
+    """Remove all diacritic marks from Latin base characters"""
+    # ascii text has no marks to remove
+    if txt.isascii():
+        return sys.intern(txt)
+    return sys.intern(_shave_marks_latin(txt))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_name(name):
+    """Lower case `name` without marks on Latin characters and with single
+    spaces between its parts, for comparing names.
+    """
+    return sys.intern(' '.join(shave_marks_latin(name).lower().split()))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def filn(name):
+    """(first initial, last name) of `name`, lower case.  The initial of a
+    single word name is empty."""
+    f, _, l = name.lower().rpartition(' ')
+    return f[:1], sys.intern(l)
+
+
+def cache_info():
+    """Returns the hit/miss statistics of the memo caches."""
+    return {
+        'shave_marks_latin': shave_marks_latin.cache_info(),
+        'normalize_name': normalize_name.cache_info(),
+        'filn': filn.cache_info(),
+    }
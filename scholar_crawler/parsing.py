@@ -0,0 +1,142 @@
+import queue
+from time import monotonic
+from concurrent.futures import ProcessPoolExecutor
+from lxml import html
+from .metrics import STAGE_BUCKETS
+from .requests import Document, request_from_dict
+
+
+def parse_page(request_dict, url, content):
+    """
+    Parses the page `content` fetched for the request described by
+    `request_dict`.  Runs in the worker processes of a `ParseStage`, so it
+    only takes and returns plain, picklable values.
+
+    request_dict: [dict] the `to_dict` of the request
+    url: [str] url of the page
+    content: [bytes, str] the page source
+    return: [dict] with the keys
+        - requests : follow-up request dicts, without their parent author
+        - author : the parsed author dict, for Author requests
+        - document : the parsed document dict, for TitleSearch requests
+        - seconds : time spent parsing the page
+    """
+    t = monotonic()
+    request = request_from_dict(request_dict)
+    h = html.fromstring(content)
+    h.url = url
+    parsed = request.parse(h)
+    record = {'requests': [], 'seconds': monotonic() - t}
+    if request._name == 'TitleSearch':
+        record['document'] = parsed.to_dict()
+        return record
+    if request._name == 'Author':
+        record['author'] = request.to_dict()
+    for new_req in parsed:
+        d = new_req.to_dict()
+        # the parent is relinked to the live request in the main process
+        if d.get('parent_author') is not None:
+            d['parent_author'] = None
+        record['requests'].append(d)
+    return record
+
+
+def apply_record(request, record):
+    """
+    Turns the `record` returned by `parse_page` into the same result as
+    `request.parse` gives, using the live `request` object as the parent
+    author so the author graph sees a single object for each author.
+    """
+    if request._name == 'TitleSearch':
+        doc = Document.from_dict(record['document'])
+        parent = request.parent_author
+        if parent is not None:
+            if parent in doc.authors:
+                doc.authors[doc.authors.index(parent)] = parent
+            doc.parent_author = parent
+        return doc
+
+    if request._name == 'Author':
+        author = record['author']
+        request.profile_name = author['profile_name']
+        request.author_id = author['author_id']
+        request.full_title = author['full_title']
+        request.institution = author['institution']
+        request.email_domain = author['email_domain']
+        request.interests = author['interests']
+
+    new_requests = []
+    for d in record['requests']:
+        new_req = request_from_dict(d)
+        if hasattr(new_req, 'parent_author') and request._name == 'Author':
+            new_req.parent_author = request
+        new_requests.append(new_req)
+    return new_requests
+
+
+class ParseStage:
+    """
+    Parses fetched pages in a pool of worker processes, so parsing runs on
+    all cores while the crawl keeps fetching.  Results are delivered in the
+    order they complete.
+    """
+    def __init__(self, workers=None, metrics=None):
+        """
+        workers: [int] number of worker processes, defaults to the number
+            of cores
+        metrics: [Metrics] registry the parse time of the pages is recorded
+            to, see `metrics.py`
+        """
+        self.metrics = metrics
+        self.pool = ProcessPoolExecutor(workers)
+        self.completed = queue.Queue()
+        self.pending = 0
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {self.pending} pages pending at 0x{id(self):x}>'
+
+    def submit(self, request, url, content):
+        """
+        Queues the page `content` of `request` to be parsed.
+        """
+        f = self.pool.submit(parse_page, request.to_dict(), url, content)
+        self.pending += 1
+        f.add_done_callback(lambda f: self.completed.put((request, url, f)))
+        return f
+
+    def retrieve(self, timeout=None, on_error=None):
+        """
+        Returns the pages parsed since the last call as (request, parsed)
+        tuples, where `parsed` is what `request.parse` would have returned.
+
+        timeout: [float] wait up to `timeout` seconds for a page if none is
+            ready, by default returns immediately
+        on_error: [callable] called with (request, url, exception) for the
+            pages that failed to parse.  The failed pages are left out of
+            the results, so one bad page does not lose the others.
+        """
+        out = []
+        block = timeout is not None
+        while True:
+            try:
+                request, url, f = self.completed.get(block, timeout)
+            except queue.Empty:
+                return out
+            block = False
+            self.pending -= 1
+            try:
+                record = f.result()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(request, url, e)
+                continue
+            if self.metrics is not None:
+                self.metrics.histogram(
+                    'scholar_parse_seconds', 'Page parse time by request type.',
+                    STAGE_BUCKETS, type=request._name
+                ).observe(record['seconds'])
+            out.append((request, apply_record(request, record)))
+
+    def close(self):
+        self.pool.shutdown()
@@ -0,0 +1,160 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from .firefox import FirefoxSession
+from .metrics import Metrics
+
+
+class SessionPool:
+    """
+    Pool of browser sessions loading pages in parallel.  Each session is
+    used by one thread at a time and requests go to the session that is
+    free first.
+
+    A session that is shown a captcha is quarantined: it gets no work for
+    `quarantine` seconds, doubled for each captcha in a row, and the page
+    is retried on another session.  So one blocked session does not stall
+    the others.  When every session is quarantined, pages are not loaded
+    and are left to the caller, e.g. to load in a visible browser.
+    """
+    def __init__(self,
+                 size=4,
+                 cache=None,
+                 headless=True,
+                 factory=None,
+                 quarantine=300,
+                 max_quarantine=3600,
+                 metrics=None):
+        """
+        size: [int] number of sessions
+        cache: [PageCache] page cache shared by the sessions
+        headless: [bool] run the Firefox sessions without a window
+        factory: [callable] called with the index of each session, returns
+            a `FirefoxSession` compatible session.  Defaults to Firefox
+            sessions sharing `cache`, e.g. use
+            `lambda i: FirefoxSession(driver=StubDriver(pages))` to run the
+            pool without Firefox.
+        quarantine: [float] seconds a session is left out after a captcha
+        max_quarantine: [float] cap of the quarantine after repeated
+            captchas
+        metrics: [Metrics] registry the fetch latencies and quarantines are
+            recorded to, see `metrics.py`
+        """
+        if factory is None:
+            def factory(i):
+                return FirefoxSession(cache, headless=headless)
+        self.size = size
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self.sessions = [factory(i) for i in range(size)]
+        # captchas in a row and end of the quarantine of each session
+        self.strikes = [0] * size
+        self.blocked_until = [0.0] * size
+        # heap of the sessions not in use, by the time they are available
+        self._idle = [(0.0, i) for i in range(size)]
+        self._released = threading.Condition()
+        self.executor = ThreadPoolExecutor(size)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics.add_collector(self._collect)
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return (f'<{n} {self.size} sessions, {len(self.quarantined)} '
+                f'quarantined at 0x{id(self):x}>')
+
+    @property
+    def quarantined(self):
+        """
+        Indexes of the sessions in quarantine.
+        """
+        now = monotonic()
+        return [i for i, t in enumerate(self.blocked_until) if t > now]
+
+    def _acquire(self, block=True):
+        """
+        Returns the index of the next free session, waiting for a session
+        in use to be released or for a quarantine to end.  If every session
+        is quarantined, returns None when not `block`ing.
+        """
+        with self._released:
+            while True:
+                wait = None
+                if self._idle:
+                    at, i = self._idle[0]
+                    wait = at - monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self._idle)
+                        return i
+                    if not block and len(self._idle) == self.size:
+                        return None
+                self._released.wait(wait)
+
+    def _release(self, i, blocked):
+        if blocked:
+            self.strikes[i] += 1
+            t = min(self.quarantine * 2 ** (self.strikes[i] - 1), self.max_quarantine)
+            self.blocked_until[i] = monotonic() + t
+            self.metrics.counter('scholar_pool_quarantines_total',
+                                 'Sessions quarantined after a captcha.').inc()
+        else:
+            self.strikes[i] = 0
+            self.blocked_until[i] = 0.0
+        with self._released:
+            heapq.heappush(self._idle, (self.blocked_until[i], i))
+            self._released.notify_all()
+
+    def fetch(self, url, kind='url'):
+        """
+        Loads `url` in the first free session, retrying on the other free
+        sessions while the page is a captcha.  Returns the response, which
+        is still a captcha if every session got quarantined, or None if
+        every session was already quarantined.
+
+        kind: [str] request type the fetch latency is recorded under
+        """
+        latency = self.metrics.histogram(
+            'scholar_fetch_seconds', 'Page fetch latency by request type.',
+            type=kind, mode='pool'
+        )
+        response = None
+        for _ in range(self.size):
+            i = self._acquire(block=False)
+            if i is None:
+                break
+            t = monotonic()
+            try:
+                response = self.sessions[i].get(url)
+            except Exception:
+                self._release(i, False)
+                raise
+            latency.observe(monotonic() - t)
+            blocked = response.is_robot
+            self._release(i, blocked)
+            if not blocked:
+                break
+        return response
+
+    def submit(self, request, urls=None):
+        """
+        Queues the urls of `request` to be loaded.  Returns a future of the
+        list of (url, response) pairs, see `fetch` for the responses.
+
+        urls: [list] urls to load instead of `request.urls`
+        """
+        urls = request.urls if urls is None else urls
+        name = request._name
+
+        def fetch_all():
+            return [(url, self.fetch(url, name)) for url in urls]
+
+        return self.executor.submit(fetch_all)
+
+    def _collect(self, metrics):
+        metrics.gauge('scholar_pool_quarantined',
+                      'Sessions in quarantine.').set(len(self.quarantined))
+
+    def close(self):
+        self.executor.shutdown()
+        for sess in self.sessions:
+            sess.close()
@@ -1,10 +1,16 @@
 #from requests_html import HTMLSession
-from time import sleep
+from time import monotonic, sleep
 from random import lognormvariate
-from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, wait
 from .firefox import FirefoxSession
+from .frontier import Frontier
 from .graph import AuthorGraph
-from .requests import AuthorSearch
+from .journal import CrawlJournal
+from .metrics import STAGE_BUCKETS, WAIT_BUCKETS, Metrics
+from .parsing import ParseStage
+from .pool import SessionPool
+from .requests import AuthorSearch, RequestQueue
+from .seen import SeenSet
 
 
 class ScholarQueue:
@@ -12,21 +18,69 @@ class ScholarQueue:
                  max_hops=1, 
                  sleep_between=True,
                  max_author_search_page=3,
-                 max_author_page=2):
+                 max_author_page=2,
+                 priority=None,
+                 cache=None,
+                 journal=None,
+                 http_queue=None,
+                 metrics=None,
+                 seen=None,
+                 session=None,
+                 session_pool=None):
+        """
+        max_hops: [int] number of hops from the searched authors to crawl
+        sleep_between: [bool] sleep a random time between requests
+        max_author_search_page: [int] pages of author search results to crawl
+        max_author_page: [int] pages of each author's publications to crawl
+        priority: [callable] frontier priority policy, see `frontier.py`.
+            Defaults to breadth-first by hop.
+        cache: [PageCache] on-disk cache of fetched pages, see `cache.py`
+        journal: [str, CrawlJournal] path of a journal to record the crawl
+            to, see `resume` to continue a crawl from its journal.
+        http_queue: [RequestQueue] queue used by `crawl(mode='http')`,
+            defaults to a `RequestQueue` sharing the page cache.
+        metrics: [str, Metrics] path of a file to export the crawl metrics
+            to, a `.prom` file for Prometheus text format and json lines
+            otherwise, or a metrics registry, see `metrics.py`
+        seen: [str, SeenSet] path of the set of urls, authors and titles
+            crawled in earlier runs, or the set itself, see `seen.py`.
+            Requests already crawled are not queued again.
+        session: [FirefoxSession] browser session to use instead of opening
+            Firefox, any object with the same `get` and `current_response`
+        session_pool: [int, SessionPool] pool of sessions used by
+            `crawl(mode='pool')`, or the number of headless Firefox sessions
+            to open for it, see `pool.py`
+        """
         #self.sess = HTMLSession()
         self.max_hops = max_hops
         self.sleep_between = sleep_between
         self.max_author_search_page = max_author_search_page
         self.max_author_page = max_author_page
         self.set_sleep()
-        self.request_queue = []
+        self.request_queue = Frontier(priority)
         self.author_graph = AuthorGraph()
         self.active_request = None
         self.active_response = None
+        if isinstance(journal, str):
+            journal = CrawlJournal(journal)
+        self.journal = journal
+        if not isinstance(metrics, Metrics):
+            metrics = Metrics(metrics)
+        self.metrics = metrics
+        self._queued_types = set()
+        metrics.add_collector(self._collect)
+        if isinstance(seen, str):
+            seen = SeenSet(seen)
+        self.seen = seen
+        self.http_queue = http_queue
+        self.session_pool = session_pool
 
-        print('Opening Firefox...')
-        print('If prompted by Windows, allow access to Networks.')
-        self.sess = FirefoxSession()
+        self.cache = cache
+        if session is None:
+            print('Opening Firefox...')
+            print('If prompted by Windows, allow access to Networks.')
+            session = FirefoxSession(cache)
+        self.sess = session
         # initialize cookies, check for captcha
         self.sess.get('https://scholar.google.com')
         print('Opening Google Scholar, solve the captcha if needed...')
@@ -49,11 +103,38 @@ class ScholarQueue:
 
     @property
     def status(self):
-        c = Counter([r._name for r in self.request_queue])
-        s = f'ScholarQueue: {len(self.request_queue)} requests in queue\n'
+        rq = self.request_queue
+        c = rq.counts()
+        s = f'ScholarQueue: {len(rq)} requests in queue\n'
         s += '\n'.join([f'  - {k}: {v}' for k, v in c.items()])
+        s += (f'\n  {rq.n_coalesced} of {rq.n_added} added requests coalesced'
+              f', {rq.n_reranked} re-ranked'
+              f'\n  priority: {rq.policy!r}')
+        if self.cache is not None:
+            st = self.cache.stats
+            s += (f'\n  cache: {st["hits"]} hits, {st["misses"]} misses '
+                  f'({st["hit_rate"]:.0%} hit rate)')
+        s += ''.join(f'\n  {line}' for line in self.metrics.summary()
+                     if not line.startswith('scholar_queue_depth'))
         return s
 
+    def _collect(self, metrics):
+        """
+        Sets the queue depth gauges before the metrics are exported.
+        """
+        counts = self.request_queue.counts()
+        self._queued_types.update(counts)
+        for name in self._queued_types:
+            metrics.gauge('scholar_queue_depth', 'Pending requests by type.',
+                          type=name).set(counts.get(name, 0))
+
+    def _skip_seen(self, kind):
+        self.metrics.counter('scholar_seen_skipped_total',
+                             'Fetches skipped as already crawled.', kind=kind).inc()
+
+    def _mark_page(self):
+        self.metrics.meter('scholar_pages', 'Pages fetched.').mark()
+
     def get_next(self):
         """
         Pops the next request from the queue and a request/response pair
@@ -62,16 +143,75 @@ class ScholarQueue:
         if self.sleep_between:
             t = lognormvariate(self._mu, self._sigma) / self._div
             sleep(t)
-        self.active_request = request = self.request_queue.pop(0)
-        for url in request.urls:
+        self.active_request = request = self.request_queue.pop()
+        latency = self.metrics.histogram(
+            'scholar_fetch_seconds', 'Page fetch latency by request type.',
+            type=request._name, mode='browser'
+        )
+        for url in self._unseen_urls(request):
+            t = monotonic()
             self.active_response = response = self.sess.get(url)
+            latency.observe(monotonic() - t)
+            self._mark_page()
             # check for robot detection, alert user
             if self._check_for_robot():
-                ans = input('Google has detected a robot.  Do you want to solve the captcha? ([y]/n):')
-                self._input_handler(ans)
-                self.active_response = response = self.sess.current_response
+                self._count_captcha('browser')
+                self.active_response = response = self._solve_captcha()
             # response.html.lxml.url = url
             yield request, response
+        self._request_done(request)
+
+    def enqueue(self, request):
+        """
+        Adds `request` to the request queue, recording it in the journal.
+        Requests in the `seen` set are skipped.
+        """
+        if self.seen is not None and self.seen.seen_request(request):
+            self._skip_seen(request._name)
+            return False
+        queued = self.request_queue.append(request)
+        if queued and self.journal is not None:
+            self.journal.record_push(request)
+        return queued
+
+    def resume(self, path, compact_every=50000):
+        """
+        Rebuilds the author graph and request queue from the journal at
+        `path`, then continues recording to it.  Call `crawl` to pick up
+        where the journaled crawl stopped.
+        """
+        n = CrawlJournal.replay(path, self.author_graph, self.request_queue)
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = CrawlJournal(path, compact_every)
+        self.journal.compact(self.author_graph, self.request_queue)
+        print(f'Resumed {n} journal records: {self.author_graph!r}, '
+              f'{len(self.request_queue)} pending requests')
+
+    def _count_captcha(self, mode):
+        """
+        Counts a page blocked by a captcha, once per page.
+
+        mode: ['browser', 'http', 'pool'] how the blocked page was fetched
+        """
+        self.metrics.counter('scholar_captcha_total', 'Pages blocked by a captcha.',
+                             mode=mode).inc()
+
+    def _solve_captcha(self):
+        """
+        Asks the user to solve the captcha shown in Firefox, returns the
+        browser's response once it is solved.  The user is not asked if
+        the page shown is no longer a captcha.
+        """
+        response = self.sess.current_response
+        if not response.is_robot:
+            return response
+        with self.metrics.timer('scholar_captcha_wait_seconds',
+                                'Time spent waiting on the user to solve captchas.',
+                                WAIT_BUCKETS):
+            ans = input('Google has detected a robot.  Do you want to solve the captcha? ([y]/n):')
+            self._input_handler(ans)
+        return self.sess.current_response
 
     def _input_handler(self, ans):
         if (not ans) or (ans.lower()[0]=='y'):
@@ -85,13 +225,7 @@ class ScholarQueue:
         """
         Checks to see if google has detected that we are scraping
         """
-        msgs = [
-            'Our systems have detected unusual traffic from your computer network',
-            "Please show you're not a robot",
-            "Sorry, we can't verify that you're not a robot",
-            "really you sending the requests, and not a robot"
-        ]
-        return any(msg in self.active_response.content for msg in msgs)
+        return self.active_response.is_robot
 
     def search_authors(self, author_str, verbose=None):
         """
@@ -100,7 +234,7 @@ class ScholarQueue:
         """
         auth_search = AuthorSearch.from_author_string(author_str)
         auth_search.max_page = self.max_author_search_page
-        self.request_queue.append(auth_search)
+        self.enqueue(auth_search)
         self.crawl(verbose=verbose)
 
     def process_response(self, request, response, verbose=False):
@@ -108,44 +242,60 @@ class ScholarQueue:
         Uses the request to parse the response.html.lxml and add the results to
         the `author_graph`.
         """
+        self._prepare(request)
+        with self.metrics.timer('scholar_parse_seconds',
+                                'Page parse time by request type.',
+                                STAGE_BUCKETS, type=request._name):
+            parsed = request.parse(response.html.lxml)
+        self.process_parsed(request, parsed, verbose)
+
+    def _prepare(self, request):
+        """
+        Sets up `request` before its response is parsed.
+        """
+        # stops parsing documents if the Author is the last hop
+        if request._name == 'Author':
+            if request.hop >= self.max_hops:
+                request.max_page = 0
+
+    def process_parsed(self, request, parsed, verbose=False):
+        """
+        Adds the result of `request.parse` to the `author_graph` and queues
+        the follow-up requests.
+        """
         # need to track the hops here
         # check if auther/paper is already in the graph
-        hop = request.hop
-        
+
         # handle Document objects separately
         if request._name == 'TitleSearch':
-            document = request.parse(response.html.lxml)
-            new_authors = self.author_graph.add_publication(document)
+            document = parsed
+            with self.metrics.timer('scholar_graph_add_seconds',
+                                    'Time adding a document to the author graph.',
+                                    STAGE_BUCKETS):
+                new_authors = self.author_graph.add_publication(document)
+            self.request_queue.observe(request, len(new_authors))
+            if self.journal is not None:
+                self.journal.record_document(document)
             if verbose: 
                 print(f'-- Document {document.doc_id}:> added to graph')
 
             for author in new_authors:
-                self.request_queue.append(author)
+                self.enqueue(author)
             if verbose: 
                 print(f'-- Document :> {len(new_authors)} Authors added to queue')
             return
 
-        # stops parsing documents if the Author is the last hop
-        if request._name == 'Author':
-            if hop >= self.max_hops:
-                request.max_page = 0
-
-        # parse the result to get the next set of request objects
-        new_requests = request.parse(response.html.lxml)
+        # the next set of request objects
+        new_requests = parsed
         for new_req in new_requests:
-            self.request_queue.append(new_req)
+            self.enqueue(new_req)
         
         if verbose and new_requests: 
             # not exactly correct, but close enough...
             print(f'-- {request._name} :> {len(new_requests)} {new_req._name} added to queue')
 
-    def crawl(self, steps=0, verbose=None):
-        """
-        Begins the crawling process.
-
-        :steps: [int] How many requests to crawl.  Use 0 for continuous crawling
-        :verbose: [None, True, False, 'v-', 'vv', '-v'] Sets the verbosity level
-        """
+    @staticmethod
+    def _verbosity(verbose):
         if verbose not in (None, True, False, 'v-', 'vv', '-v'):
             raise ValueError('verbose must be None, True, False, `v-`, `vv`, or `-v`.')
         if verbose is None or verbose==False:
@@ -154,17 +304,344 @@ class ScholarQueue:
             v1 = v2 = True
         else:
             v1, v2 = verbose[0]=='v', verbose[1]=='v'
+        return v1, v2
+
+    def crawl(self, steps=0, verbose=None, mode='browser'):
+        """
+        Begins the crawling process.
+
+        :steps: [int] How many requests to crawl.  Use 0 for continuous crawling
+        :verbose: [None, True, False, 'v-', 'vv', '-v'] Sets the verbosity level
+        :mode: ['browser', 'http', 'pool'] Fetch pages one at a time in
+            Firefox, in parallel through the `http_queue`, see `crawl_http`,
+            or in parallel browser sessions, see `crawl_pool`
+        """
+        if mode not in ('browser', 'http', 'pool'):
+            raise ValueError('mode must be `browser`, `http` or `pool`.')
+        if mode == 'http':
+            return self.crawl_http(steps, verbose)
+        if mode == 'pool':
+            return self.crawl_pool(steps, verbose)
+        v1, v2 = self._verbosity(verbose)
         if v1:
             print('Begining crawl:')
         i = 1
-        while True:
+        while self.request_queue:
             for request, response in self.get_next():
                 self.process_response(request, response, v2)
+            if self.journal is not None:
+                self.journal.maybe_compact(self.author_graph, self.request_queue)
+            if self.seen is not None:
+                self.seen.maybe_save()
+            self.metrics.maybe_export()
             if v1:
                 print(f'({i}) Queue Status :> {len(self.request_queue)} pending requests')
             if steps and i>=steps:
                 break
             i += 1
+        self._save_state()
+
+    def crawl_http(self, 
+                   steps=0, 
+                   verbose=None, 
+                   max_in_flight=None, 
+                   poll=1.0,
+                   parse_workers=0):
+        """
+        Crawls by sending requests in parallel through the `http_queue`.
+        When Google blocks a request, the page is loaded in Firefox to solve
+        the captcha and the browser's cookies are handed to the http queue.
+
+        :steps: [int] How many requests to crawl.  Use 0 for continuous crawling
+        :verbose: [None, True, False, 'v-', 'vv', '-v'] Sets the verbosity level
+        :max_in_flight: [int] Urls sent before waiting on responses,
+            defaults to twice the pool size of the http queue, and is capped
+            at the backlog of the http queue
+        :poll: [float] Seconds to wait for a response before checking the
+            queue status again
+        :parse_workers: [int] Number of processes parsing the pages, see
+            `parsing.ParseStage`.  Use 0 to parse in this process
+        """
+        v1, v2 = self._verbosity(verbose)
+        stage = ParseStage(parse_workers, self.metrics) if parse_workers else None
+        try:
+            self._crawl_http(steps, v1, v2, max_in_flight, poll, stage)
+        finally:
+            if stage is not None:
+                stage.close()
+            self._save_state()
+
+    def _crawl_http(self, steps, v1, v2, max_in_flight, poll, stage):
+        if self.http_queue is None:
+            self.http_queue = RequestQueue(cache=self.cache, metrics=self.metrics,
+                                           seen=self.seen)
+        hq = self.http_queue
+        max_in_flight = max_in_flight or 2 * hq.pool_size
+        if hq.max_backlog:
+            max_in_flight = min(max_in_flight, hq.max_backlog)
+        if v1:
+            print('Begining http crawl:')
+        # remaining url count, whether all pages loaded, and times popped of
+        # each request in flight
+        in_flight = {}
+        n_in_flight = 0
+        # a popped request waiting for room in the http queue
+        waiting = None
+
+        def finish(request, complete=True):
+            pending = in_flight[id(request)]
+            pending[0] -= 1
+            pending[1] = pending[1] and complete
+            if not pending[0]:
+                del in_flight[id(request)]
+                for _ in range(pending[2]):
+                    self._request_done(request, pending[1])
+
+        def failed(request, url, error):
+            nonlocal n_in_flight
+            n_in_flight -= 1
+            self._fetch_failed(request, url, error, v1)
+            finish(request, False)
+
+        def parse_failed(request, url, error):
+            self._parse_failed(request, url, error, v1)
+            finish(request, False)
+
+        in_flight_gauge = self.metrics.gauge('scholar_http_in_flight',
+                                             'Urls sent and not yet processed.')
+        i = 0
+        while True:
+            while (waiting is not None 
+                   or (self.request_queue and not (steps and i >= steps))):
+                if waiting is None:
+                    waiting = self.request_queue.pop()
+                    i += 1
+                n_urls = len(waiting.urls)
+                if not n_urls:
+                    self._request_done(waiting, False)
+                    waiting = None
+                    continue
+                if n_in_flight and n_in_flight + n_urls > max_in_flight:
+                    break
+                # the same request object can be queued again while in flight
+                pending = in_flight.setdefault(id(waiting), [0, True, 0])
+                pending[2] += 1
+                # urls already crawled are skipped by the http queue
+                n_queued = hq.add_request(waiting)
+                pending[0] += n_queued
+                n_in_flight += n_queued
+                if not pending[0]:
+                    del in_flight[id(waiting)]
+                    self._request_done(waiting, False)
+                waiting = None
+            if not in_flight:
+                break
+
+            wait = poll
+            if stage is not None and stage.pending:
+                wait = 0.01
+            for request, url, response in hq.retrieve_responses(wait, failed):
+                n_in_flight -= 1
+                self.active_request = request
+                self.active_response = response
+                self._mark_page()
+                if self._check_for_robot():
+                    self._count_captcha('http')
+                    response = self._browser_fallback(url)
+                elif response.status != 200:
+                    self._fetch_failed(request, url, f'http status {response.status}', v1)
+                    finish(request, False)
+                    continue
+                if stage is None:
+                    self.process_response(request, response, v2)
+                    finish(request)
+                else:
+                    self._prepare(request)
+                    stage.submit(request, url, response.content)
+            if stage is not None:
+                for request, parsed in stage.retrieve(on_error=parse_failed):
+                    self.process_parsed(request, parsed, v2)
+                    finish(request)
+            if self.journal is not None:
+                self.journal.maybe_compact(self.author_graph, self.request_queue)
+            if self.seen is not None:
+                self.seen.maybe_save()
+            in_flight_gauge.set(n_in_flight)
+            self.metrics.maybe_export()
+            if v1:
+                print(f'({i}) Queue Status :> {len(self.request_queue)} pending, '
+                      f'{len(in_flight)} in flight')
+
+    def crawl_pool(self, steps=0, verbose=None, max_in_flight=None, poll=1.0):
+        """
+        Crawls by loading pages in the parallel sessions of the
+        `session_pool`.  Sessions shown a captcha are quarantined by the
+        pool.  When all of them are, pages are loaded in this queue's
+        browser session, where the user can solve the captcha.
+
+        :steps: [int] How many requests to crawl.  Use 0 for continuous crawling
+        :verbose: [None, True, False, 'v-', 'vv', '-v'] Sets the verbosity level
+        :max_in_flight: [int] Requests sent to the pool before waiting on
+            their pages, defaults to twice the number of sessions
+        :poll: [float] Seconds to wait for a page before checking the
+            queue status again
+        """
+        v1, v2 = self._verbosity(verbose)
+        if not isinstance(self.session_pool, SessionPool):
+            self.session_pool = SessionPool(
+                self.session_pool or 4, self.cache, metrics=self.metrics
+            )
+        try:
+            self._crawl_pool(steps, v1, v2, max_in_flight, poll)
+        finally:
+            self._save_state()
+
+    def _crawl_pool(self, steps, v1, v2, max_in_flight, poll):
+        pool = self.session_pool
+        max_in_flight = max_in_flight or 2 * pool.size
+        if v1:
+            print(f'Begining crawl with {pool.size} sessions:')
+        # request sent to the pool, by future
+        in_flight = {}
+        in_flight_gauge = self.metrics.gauge('scholar_pool_in_flight',
+                                             'Requests sent to the session pool.')
+        i = 0
+        while True:
+            while (self.request_queue and len(in_flight) < max_in_flight
+                   and not (steps and i >= steps)):
+                request = self.request_queue.pop()
+                i += 1
+                urls = self._unseen_urls(request)
+                if not urls:
+                    self._request_done(request, False)
+                    continue
+                f = pool.submit(request, urls)
+                in_flight[f] = request
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, timeout=poll, return_when=FIRST_COMPLETED)
+            for f in done:
+                request = in_flight.pop(f)
+                try:
+                    pages = f.result()
+                except Exception as e:
+                    self._fetch_failed(request, request.request_url, e, v1)
+                    self._request_done(request, False)
+                    continue
+                for url, response in pages:
+                    self.active_request = request
+                    if response is None:
+                        # every session is quarantined
+                        response = self._browser_fallback(url, blocked=False)
+                        self._mark_page()
+                    else:
+                        self.active_response = response
+                        self._mark_page()
+                        if self._check_for_robot():
+                            self._count_captcha('pool')
+                            response = self._browser_fallback(url)
+                    self.process_response(request, response, v2)
+                self._request_done(request)
+            if self.journal is not None:
+                self.journal.maybe_compact(self.author_graph, self.request_queue)
+            if self.seen is not None:
+                self.seen.maybe_save()
+            in_flight_gauge.set(len(in_flight))
+            self.metrics.maybe_export()
+            if v1:
+                print(f'({i}) Queue Status :> {len(self.request_queue)} pending, '
+                      f'{len(in_flight)} in flight')
+
+    def _fetch_failed(self, request, url, reason, verbose=False):
+        """
+        Counts a page that failed to load.  Its request is finished without
+        the page, so one failure does not stop the crawl.
+        """
+        self.metrics.counter('scholar_fetch_failed_total',
+                             'Pages that failed to load.', type=request._name).inc()
+        if verbose:
+            print(f'-- {request._name} :> failed to load {url}: {reason}')
+
+    def _parse_failed(self, request, url, error, verbose=False):
+        """
+        Counts a page that failed to parse.  Its request is finished without
+        the page, like a page that failed to load.
+        """
+        self.metrics.counter('scholar_parse_failed_total',
+                             'Pages that failed to parse.', type=request._name).inc()
+        if verbose:
+            print(f'-- {request._name} :> failed to parse {url}: {error!r}')
+
+    def _unseen_urls(self, request):
+        """
+        Returns the urls of `request` that are not in the `seen` set.
+        """
+        if self.seen is None:
+            return request.urls
+        urls = []
+        for url in request.urls:
+            if self.seen.seen_url(url):
+                self._skip_seen('url')
+            else:
+                urls.append(url)
+        return urls
+
+    def _save_state(self):
+        """
+        Saves the seen set and exports the metrics at the end of a crawl.
+        """
+        if self.seen is not None and self.seen.path:
+            self.seen.save()
+        if self.metrics.path:
+            self.metrics.export()
+
+    def _request_done(self, request, complete=True):
+        """
+        Records that `request` is finished.  It is added to the `seen` set
+        if all its pages were processed.
+        """
+        if self.journal is not None:
+            self.journal.record_done(request)
+        if complete:
+            self._mark_seen(request)
+
+    def _mark_seen(self, request):
+        """
+        Adds `request` and its urls to the `seen` set, after its pages were
+        parsed and added to the graph.  Authors at the last hop are left
+        out: only the first page of their publications was loaded, and
+        none of them was crawled.
+        """
+        if self.seen is None:
+            return
+        if request._name == 'Author' and not request.max_page:
+            return
+        self.seen.add_request(request)
+        for url in request.urls:
+            self.seen.add_url(url)
+
+    def _browser_fallback(self, url, blocked=True):
+        """
+        Loads `url` in Firefox after the http queue or the session pool was
+        blocked, lets the user solve the captcha, and hands the browser's
+        cookies back to the http queue.  Returns the browser's response for
+        `url`.
+
+        blocked: [bool] the page was shown a captcha and counted by the
+            caller, otherwise a captcha in Firefox is counted here
+        """
+        with self.metrics.timer('scholar_fetch_seconds',
+                                'Page fetch latency by request type.',
+                                type=self.active_request._name, mode='fallback'):
+            self.active_response = self.sess.get(url)
+        if self._check_for_robot():
+            if not blocked:
+                self._count_captcha('browser')
+            self.active_response = self._solve_captcha()
+        if self.http_queue is not None:
+            self.http_queue.set_cookies(self.sess.cookies, self.sess.user_agent)
+        return self.active_response
 
 # result parser for next button...
     # res = sess.get('https://scholar.google.com/citations?hl=en&view_op=search_authors&mauthors=unimi.it')
@@ -0,0 +1,235 @@
+import os
+import random
+import sqlite3
+import threading
+import zlib
+from time import monotonic, sleep
+from .firefox import ROBOT_MESSAGES, Response
+from .seen import canonical_url
+
+# Record and replay of the pages of a crawl, to run crawls offline and
+# repeatably, e.g. to profile the crawl throughput and the queue behavior.
+#
+#   sq = ScholarQueue(session=ReplaySession('crawl.pages', 'record', FirefoxSession()))
+#   ...
+#   sq = ScholarQueue(session=ReplaySession('crawl.pages', latency='recorded'))
+
+CAPTCHA_PAGE = f'<html><body><p>{ROBOT_MESSAGES[0]}</p></body></html>'
+EMPTY_PAGE = '<html><head></head><body></body></html>'
+
+
+class PageArchive:
+    """
+    Pages of a crawl stored in a single SQLite file, compressed with zlib
+    and keyed by their canonical url, with the time they took to load.
+    """
+    def __init__(self, path, level=6):
+        """
+        path: [str] location of the archive, added to if it exists
+        level: [int] zlib compression level of the pages
+        """
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'key TEXT PRIMARY KEY, url TEXT, content BLOB, text INTEGER, '
+            'seconds REAL)'
+        )
+        self._conn.commit()
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {self.path!r}, {len(self)} pages>'
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM pages WHERE key=?', (canonical_url(url),)
+            ).fetchone() is not None
+
+    def put(self, url, final_url, content, seconds=0.0):
+        """
+        Stores the page `content` loaded for `url`, replacing any page
+        stored for it.
+
+        final_url: [str] url of the page after redirects
+        content: [str, bytes] the page source
+        seconds: [float] time the page took to load
+        """
+        text = isinstance(content, str)
+        data = content.encode('utf-8') if text else content
+        data = zlib.compress(data, self.level)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                (canonical_url(url), final_url, data, text, seconds)
+            )
+            self._conn.commit()
+
+    def get(self, url):
+        """
+        Returns the (final url, content, seconds) stored for `url`, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, content, text, seconds FROM pages WHERE key=?',
+                (canonical_url(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        final_url, data, text, seconds = row
+        content = zlib.decompress(data)
+        return final_url, content.decode('utf-8') if text else content, seconds
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ReplaySession:
+    """
+    Session with the `get` and `current_response` of a `FirefoxSession`
+    that records the pages loaded by a live session to a `PageArchive`, or
+    serves the pages of an archive without a browser.
+
+    When replaying, the load time of the pages can be simulated and
+    captcha pages injected.  An injected captcha is only returned by `get`,
+    `current_response` then serves the page as if the captcha was solved,
+    so replayed crawls run without the user.
+    """
+    def __init__(self,
+                 archive,
+                 mode='replay',
+                 session=None,
+                 latency=None,
+                 captcha_rate=0.0,
+                 seed=None,
+                 strict=False):
+        """
+        archive: [str, PageArchive] path of the archive, or the archive
+        mode: ['record', 'replay'] record the pages loaded by `session`,
+            or serve the pages of the archive
+        session: [FirefoxSession] live session recorded from
+        latency: [None, float, 'recorded', callable] when replaying, sleep
+            this many seconds per page, the time the page took to record,
+            or the seconds returned by calling `latency()`.  None to serve
+            the pages right away.
+        captcha_rate: [float] share of the pages replaced by a captcha
+        seed: [int] seed of the captcha injection
+        strict: [bool] raise KeyError for pages missing from the archive,
+            instead of serving an empty page
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError('mode must be `record` or `replay`.')
+        if mode == 'record' and session is None:
+            raise ValueError('Recording needs a live session.')
+        if isinstance(archive, str):
+            archive = PageArchive(archive)
+        self.archive = archive
+        self.mode = mode
+        self.session = session
+        self.latency = latency
+        self.captcha_rate = captcha_rate
+        self.strict = strict
+        self._random = random.Random(seed)
+        self._url = None
+        self._response = Response('about:blank', EMPTY_PAGE)
+        self.n_gets = 0
+        self.n_captchas = 0
+        self.misses = []
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {self.mode} {self.archive!r}, {self.n_gets} pages loaded>'
+
+    def get(self, url):
+        self.n_gets += 1
+        self._url = url
+        if self.mode == 'record':
+            t = monotonic()
+            response = self.session.get(url)
+            self._record(url, response, monotonic() - t)
+            return response
+        return self._replay(url)
+
+    def _record(self, url, response, seconds):
+        if not response.is_robot:
+            self.archive.put(url, response.url, response.content, seconds)
+
+    def _replay(self, url):
+        page = self.archive.get(url)
+        if page is None:
+            if self.strict:
+                raise KeyError(f'{url} is not in the archive.')
+            self.misses.append(url)
+            page = (url, EMPTY_PAGE, 0.0)
+        final_url, content, seconds = page
+        self._sleep(seconds)
+        self._response = Response(final_url, content)
+        if self.captcha_rate > 0 and self._random.random() < self.captcha_rate:
+            self.n_captchas += 1
+            return Response(url, CAPTCHA_PAGE)
+        return self._response
+
+    def _sleep(self, recorded):
+        latency = self.latency
+        if latency is None:
+            return
+        if latency == 'recorded':
+            t = recorded
+        elif callable(latency):
+            t = latency()
+        else:
+            t = latency
+        if t > 0:
+            sleep(t)
+
+    @property
+    def current_response(self):
+        if self.mode == 'record':
+            response = self.session.current_response
+            # the page loaded after the user solved a captcha
+            if self._url is not None:
+                self._record(self._url, response, 0.0)
+            return response
+        return self._response
+
+    @property
+    def url(self):
+        if self.mode == 'record':
+            return self.session.url
+        return self._url
+
+    @property
+    def cookies(self):
+        return self.session.cookies if self.mode == 'record' else []
+
+    @property
+    def user_agent(self):
+        if self.mode == 'record':
+            return self.session.user_agent
+        return self.__class__.__name__
+
+    def show(self, cmd_show=1):
+        if self.mode == 'record':
+            self.session.show(cmd_show)
+
+    def minimize(self):
+        if self.mode == 'record':
+            self.session.minimize()
+
+    def maximize(self):
+        if self.mode == 'record':
+            self.session.maximize()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
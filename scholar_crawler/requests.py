@@ -2,15 +2,21 @@ import urllib3
 import certifi
 import abc
 import sys
-import re
+import queue
+import threading
 from hashlib import md5
 from lxml import html
 from collections import Counter
 from dataclasses import dataclass
 from random import choices
-from time import sleep
-from urllib.parse import parse_qs, quote, unquote, urlencode
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import monotonic, sleep
+from urllib.parse import quote, unquote, urlencode
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from . import extract
+from .cache import CachedHTTPResponse
+from .firefox import Response, is_robot_page
+from .metrics import Metrics
+from .names import normalize_name
 
 def first(x, default=[]):
     if x:
@@ -43,6 +49,23 @@ class BaseRequestHandler(metaclass=abc.ABCMeta):
     def _name(self):
         return self.__class__.__name__
 
+    @property
+    def key(self):
+        """
+        Identifies equivalent requests, used to coalesce queued requests.
+        """
+        return (self._name, self.request_url)
+
+    def to_dict(self):
+        """
+        Returns a json serializable dictionary of the request, the inverse
+        of `request_from_dict`.  Only needed to journal the request, see
+        `journal.py`.
+        """
+        raise NotImplementedError(
+            f'{self._name} requests cannot be journaled, define `to_dict`.'
+        )
+
 
 class AuthorSearch(BaseRequestHandler):
 
@@ -67,19 +90,18 @@ class AuthorSearch(BaseRequestHandler):
         return: [(next)AuthorSeach, Authors...]
         """
         base = 'https://scholar.google.com'
-        author_links = h.xpath('//div[@class="gs_ai_t"]/h3/a')
         authors = [
             Author(
                 name=a.text,
                 profile_name=a.text,
-                author_id=parse_qs(a.get('href')).get('user')[0],
+                author_id=extract.user_id(a.get('href')),
                 max_page=self.max_author_page,
                 request_url=base + a.get('href') + '&view_op=list_works'
             )
-            for a in author_links
+            for a in extract.AUTHOR_LINKS(h)
         ]
         # paginate by finding the "next page" button
-        next_btn = h.xpath('//button[contains(@class, "gs_btnPR") and @onclick]')
+        next_btn = extract.NEXT_BUTTON(h)
         next_url = ''
         if next_btn:
             next_url = (base
@@ -103,6 +125,21 @@ class AuthorSearch(BaseRequestHandler):
     def urls(self):
         return [self.request_url]
 
+    def to_dict(self):
+        return {
+            'type': self._name,
+            'request_url': self.request_url,
+            'max_page': self.max_page,
+            'max_author_page': self.max_author_page,
+            'page': self.page,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls(d['request_url'], d['max_page'], d['max_author_page'])
+        obj.page = d['page']
+        return obj
+
     @classmethod
     def from_author_string(cls, author_str):
         aterm = quote(author_str, safe=' "').replace(' ', '+')
@@ -146,6 +183,17 @@ class Author(BaseRequestHandler):
     def __hash__(self):
         return self.__key
 
+    @property
+    def key(self):
+        return (self._name, self.author_id or self.request_url or self.name)
+
+    @property
+    def normalized_name(self):
+        """
+        The name in lower case, without marks on Latin characters.
+        """
+        return normalize_name(self.name)
+
     def randomize_empty_id(self):
         """
         Set the empty `author_id` attribute to a random string.  Used for 
@@ -165,36 +213,17 @@ class Author(BaseRequestHandler):
         h: [lxml.html] html object
         return: dict of the author id, profile name, and institution
         """
-        # a blank generic type with a single method to handle missing elements
-        blank = type('Element', (), {'text_content': lambda self: ''})
-        
         # get all of the author information
-        author_id = parse_qs(h.url.split('?')[-1]).get('user', [])[0]
-        profile_name = first(h.xpath('//div[@id="gsc_prf_in"]')).text_content()
-        full_title = first(h.xpath('//div[@class="gsc_prf_il"]'), blank()).text_content()
-        institution = first(h.xpath('//a[@class="gsc_prf_ila"]'), blank()).text_content()
-        email_domain = first(h.xpath('//div[@id="gsc_prf_ivh"]'), blank()).text_content()
-        interests = h.xpath('//div[@id="gsc_prf_int"]/a/text()')
+        author_id = extract.user_id(h.url)
+        profile_name = extract.first_text(extract.PROFILE_NAME, h)
+        full_title = extract.first_text(extract.PROFILE_TITLE, h)
+        institution = extract.first_text(extract.PROFILE_INSTITUTION, h)
+        email_domain = extract.first_text(extract.PROFILE_EMAIL, h)
+        interests = extract.PROFILE_INTERESTS(h)
 
         # pull the title fragments for each publication.
-        # title_fragments = [
-        #     #a.text_content().split('  ')
-        #     a.xpath('./text()')
-        #     for a in h.xpath('//td[@class="gsc_a_t"]/a')
-        # ]
-
-        title_fragments = [
-            [t.strip(' -\xa0\u2026') for t in a.xpath('./text()')]
-            for a in h.xpath('//td[@class="gsc_a_t"]/a')
-        ]
-
         title_fragments = [
-            [
-                f.strip() for frag in t_frags 
-                for f in re.split(r'[^A-Za-z0-9;:" \[\]{},\.\-]+', frag) 
-                if len(f.strip()) > 2
-            ]
-            for t_frags in title_fragments
+            extract.title_fragments(a) for a in extract.PUBLICATION_LINKS(h)
         ]
 
         self.profile_name = profile_name
@@ -213,6 +242,41 @@ class Author(BaseRequestHandler):
             return queries
         return []
 
+    def to_dict(self):
+        return {
+            'type': self._name,
+            'name': self.name,
+            'profile_name': self.profile_name,
+            'author_id': self.author_id,
+            'max_page': self.max_page,
+            'request_url': self.request_url,
+            'hop': self.hop,
+            'full_title': self.full_title,
+            'institution': self.institution,
+            'email_domain': self.email_domain,
+            'interests': self.interests,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        # random ids are assigned after the key is set, see randomize_empty_id
+        random_id = d['author_id'].startswith('#')
+        obj = cls(
+            name=d['name'],
+            profile_name=d['profile_name'],
+            author_id='' if random_id else d['author_id'],
+            max_page=d['max_page'],
+            request_url=d['request_url'],
+            hop=d['hop']
+        )
+        if random_id:
+            obj.author_id = d['author_id']
+        obj.full_title = d['full_title']
+        obj.institution = d['institution']
+        obj.email_domain = d['email_domain']
+        obj.interests = list(d['interests'])
+        return obj
+
     @property
     def urls(self):
         if not self.request_url:
@@ -265,6 +329,26 @@ class TitleSearch(BaseRequestHandler):
     def urls(self):
         return [self.request_url]
 
+    def to_dict(self):
+        parent = self.parent_author
+        return {
+            'type': self._name,
+            'request_url': self.request_url,
+            'hop': self.hop,
+            'max_author_page': self.max_author_page,
+            'parent_author': parent.to_dict() if parent else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        parent = d['parent_author']
+        return cls(
+            d['request_url'],
+            d['hop'],
+            d['max_author_page'],
+            Author.from_dict(parent) if parent else None
+        )
+
     @classmethod
     def from_search_terms(cls, terms, hop=0, parent_author=None):
         terms = [
@@ -285,32 +369,23 @@ class TitleSearch(BaseRequestHandler):
             and authors.
         """
         
-        doc_divs = h.xpath('//div[@data-did]')
-
-        for div in doc_divs:
+        for div in extract.DOCUMENT_DIVS(h):
             doc_id = div.get('data-did')
-            full_title = ''.join(div.xpath('.//h3/a/text()|.//h3/a/svg/@aria-label'))
-            
-            # \u2026 is ellipsis dots
-            authors_nolink = [
-                n
-                for a in div.xpath('.//div[@class="gs_a"]/text()') 
-                for n in a.split('\xa0')[0].strip('\u2026').split(', ')
-            ]
+            full_title = ''.join(extract.DOCUMENT_TITLE(div))
 
             # max_page = 0 to stop the crawl at 1 hop
             authors_nolink = [
                 Author(name=a, max_page=0)
-                for a in authors_nolink if len(a) > 2
+                for a in extract.document_authors_text(div) if len(a) > 2
             ]
             
             authors_linked = [
                 Author(
-                    name=a.xpath('./text()')[0],
-                    author_id=parse_qs(a.xpath('./@href')[0]).get('/citations?user', [''])[0],
+                    name=extract.TEXT(a)[0],
+                    author_id=extract.user_id(a.get('href', '')),
                     max_page=self.max_author_page
                 )
-                for a in div.xpath('.//div[@class="gs_a"]/a')
+                for a in extract.DOCUMENT_AUTHOR_LINKS(div)
             ]
 
             # pop the 'new' instance of the parent author
@@ -326,20 +401,52 @@ class TitleSearch(BaseRequestHandler):
 
 @dataclass
 class Document:
+    __slots__ = ('doc_id', 'title', 'parent_author', 'authors', '_key', '_key_id')
     doc_id: str
     title: str
     parent_author: Author
     authors: list
 
     def __post_init__(self):
-        self.__key = int(md5(self.doc_id.encode('latin1')).hexdigest()[:16], 16)
+        self._set_key()
+
+    def _set_key(self):
+        self._key_id = self.doc_id
+        self._key = int(md5(self.doc_id.encode('latin1')).hexdigest()[:16], 16)
 
     @property
     def _name(self):
         return self.__class__.__name__
 
+    def to_dict(self):
+        parent = self.parent_author
+        return {
+            'type': self._name,
+            'doc_id': self.doc_id,
+            'title': self.title,
+            'parent_author': parent.to_dict() if parent else None,
+            'authors': [a.to_dict() for a in self.authors],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Rebuilds a Document from `to_dict`.  The parent author is the same
+        object as its entry in the author list, as it is when parsed.
+        """
+        authors = [Author.from_dict(a) for a in d['authors']]
+        parent = d['parent_author']
+        if parent:
+            parent = Author.from_dict(parent)
+            if parent in authors:
+                parent = authors[authors.index(parent)]
+        return cls(d['doc_id'], d['title'], parent, authors)
+
     def __hash__(self):
-        return self.__key
+        # the hash is recomputed when doc_id has changed
+        if self._key_id is not self.doc_id:
+            self._set_key()
+        return self._key
 
     def __eq__(self, other):
         if hasattr(other, '__hash__'):
@@ -347,13 +454,43 @@ class Document:
         return False
 
 
+def request_from_dict(d):
+    """
+    Rebuilds a request handler or Document from the output of `to_dict`.
+    """
+    types = {
+        'AuthorSearch': AuthorSearch,
+        'Author': Author,
+        'TitleSearch': TitleSearch,
+        'Document': Document,
+    }
+    return types[d['type']].from_dict(d)
+
+
 class RequestQueue:
     """
     Class for queuing up http requests to be processed.
     """
 
-    def __init__(self, pool_size=5, delay=0.15):
+    def __init__(self, pool_size=5, delay=0.15, cache=None, max_backlog=None,
+                 metrics=None, seen=None):
+        """
+        pool_size: [int] number of threads and http connections
+        delay: [float] seconds each thread waits before a request
+        cache: [PageCache] pages are served from the cache when possible,
+            and successful responses are added to it.
+        max_backlog: [int] maximum number of urls queued or completed but
+            not yet retrieved.  `add_request` blocks while the backlog is
+            full, None for no limit.
+        metrics: [Metrics] registry the fetch latencies, response statuses
+            and backlog are recorded to, see `metrics.py`
+        seen: [SeenSet] urls already crawled are skipped by `add_request`.
+            The urls are added by the `ScholarQueue` once their pages are
+            processed, see `seen.py`
+        """
         self._pool_size = pool_size
+        self.cache = cache
+        self.seen = seen
         self.thread_pool = ThreadPoolExecutor(pool_size)
         self.http_pool = urllib3.PoolManager(
             maxsize=self.pool_size,
@@ -370,7 +507,16 @@ class RequestQueue:
             'Upgrade-Insecure-Requests': '1'
         }
         self.futures = {}
+        self.future_urls = {}
         self.delay = delay
+        # futures are put here by their done callback, in completion order
+        self.completed = queue.Queue()
+        self.max_backlog = max_backlog
+        self._backlog = None
+        if max_backlog:
+            self._backlog = threading.BoundedSemaphore(max_backlog)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.metrics.add_collector(self._collect)
 
     def __repr__(self):
         r = (
@@ -411,30 +557,216 @@ class RequestQueue:
         self.futures[f] = url
         return f
 
-    def add_request(self, req):
+    def _from_cache(self, url):
         """
-        Add a Request object to the queue.
+        Returns a completed future for `url` if it is in the cache.
+        """
+        if self.cache is None:
+            return None
+        data = self.cache.get(url)
+        if data is None:
+            return None
+        f = Future()
+        f.set_result(CachedHTTPResponse(url, data))
+        return f
+
+    def _store(self, url, res):
+        if res.status != 200 or is_robot_page(res.data):
+            return res
+        if self.cache is not None:
+            self.cache.set(url, res.data)
+        return res
+
+    def _request(self, url, kind='url'):
+        """
+        Sends the http request for `url`, recording its latency and status.
+
+        kind: [str] request type the fetch latency is recorded under
+        """
+        t = monotonic()
+        try:
+            res = self.http_pool.request('GET', url, headers=self.headers)
+        except Exception:
+            self.metrics.counter('scholar_http_errors_total',
+                                 'Http requests that raised.').inc()
+            raise
+        self.metrics.histogram(
+            'scholar_fetch_seconds', 'Page fetch latency by request type.',
+            type=kind, mode='http'
+        ).observe(monotonic() - t)
+        self.metrics.counter('scholar_http_responses_total',
+                             'Http responses by status.', status=res.status).inc()
+        return res
+
+    def _submit(self, url, kind='url'):
         """
-        pr = self.http_pool.request
+        Submits the http request for `url`, returns its future.
 
-        def delayed(req, *args, **kwargs):
+        kind: [str] request type the fetch latency is recorded under
+        """
+        def fetch(url):
             sleep(self.delay)
-            return req(*args, **kwargs)
+            return self._store(url, self._request(url, kind))
 
-        for url in req.urls:
-            f = self.thread_pool.submit(delayed, pr, 'GET', url, headers=self.headers)
-            #f.add_done_callback(req.callback)
+        return self.thread_pool.submit(fetch, url)
+
+    def add_request(self, req, block=True, timeout=None):
+        """
+        Add a Request object to the queue.
+
+        block, timeout: when the backlog is full, wait up to `timeout`
+            seconds for the consumer to retrieve responses.  Raises 
+            queue.Full if no space became available, no urls of `req` are
+            added in that case.
+        return: [int] number of urls queued, urls in the `seen` set are
+            skipped
+        """
+        urls = req.urls
+        if self.seen is not None:
+            n = len(urls)
+            urls = [url for url in urls if not self.seen.seen_url(url)]
+            if len(urls) < n:
+                self.metrics.counter('scholar_seen_skipped_total',
+                                     'Fetches skipped as already crawled.',
+                                     kind='url').inc(n - len(urls))
+        if self._backlog is not None:
+            if len(urls) > self.max_backlog:
+                raise ValueError(f'{req._name} has more urls than max_backlog.')
+            # reserve room for all of the urls, or none of them
+            for n in range(len(urls)):
+                if not self._backlog.acquire(block, timeout):
+                    for _ in range(n):
+                        self._backlog.release()
+                    raise queue.Full('RequestQueue backlog is full.')
+        for i, url in enumerate(urls):
+            try:
+                f = self._from_cache(url)
+                if f is None:
+                    f = self._submit(url, req._name)
+                else:
+                    self.metrics.counter('scholar_http_cache_hits_total',
+                                         'Urls served from the page cache.').inc()
+            except BaseException:
+                # the urls not submitted give back their room in the backlog
+                if self._backlog is not None:
+                    for _ in range(len(urls) - i):
+                        self._backlog.release()
+                raise
             self.futures[f] = req
-            #yield f
+            self.future_urls[f] = url
+            f.add_done_callback(self.completed.put)
+        return len(urls)
+
+    def _take(self, block=False, timeout=None):
+        """
+        Returns the next completed future with its request and url, or None
+        if none completed in time.
+        """
+        try:
+            f = self.completed.get(block, timeout)
+        except queue.Empty:
+            return None
+        if self._backlog is not None:
+            self._backlog.release()
+        return f, self.futures.pop(f), self.future_urls.pop(f)
+
+    def _drain(self, timeout=None):
+        taken = self._take(timeout is not None, timeout)
+        while taken is not None:
+            yield taken
+            taken = self._take()
+
+    def _iter_taken(self, timeout=None):
+        while self.futures:
+            taken = self._take(True, timeout)
+            if taken is None:
+                return
+            yield taken
+
+    @staticmethod
+    def _as_response(f):
+        res = f.result()
+        return Response(res.geturl(), res.data, res.status)
+
+    def _responses(self, taken, on_error):
+        for f, req, url in taken:
+            try:
+                response = self._as_response(f)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(req, url, e)
+                continue
+            yield req, url, response
+
+    def retrieve_completed(self, timeout=None):
+        """
+        Returns the requests completed since the last call as (html, request)
+        tuples, in the order they completed.
+
+        timeout: [float] wait up to `timeout` seconds for a request to 
+            complete if none has, by default returns immediately
+        """
+        return [
+            (html_from_future(f), req) for f, req, _ in self._drain(timeout)
+        ]
+
+    def retrieve_responses(self, timeout=None, on_error=None):
+        """
+        Returns the completed requests as (request, url, response) tuples,
+        where `url` is the url that was requested and `response` is a
+        `firefox.Response` of the final page.  See `retrieve_completed`.
+
+        on_error: [callable] called with (request, url, exception) for the
+            urls that failed to load, which are left out of the results.
+            By default the exception is raised.
+        """
+        return list(self._responses(self._drain(timeout), on_error))
+
+    def iter_completed(self, timeout=None):
+        """
+        Yields (html, request) tuples as the requests complete, until no
+        requests are outstanding or none completes within `timeout` seconds.
+        """
+        for f, req, _ in self._iter_taken(timeout):
+            yield html_from_future(f), req
+
+    def iter_responses(self, timeout=None, on_error=None):
+        """
+        Yields (request, url, response) tuples as the requests complete,
+        see `iter_completed` and `retrieve_responses`.
+        """
+        yield from self._responses(self._iter_taken(timeout), on_error)
+
+    def set_cookies(self, cookies, user_agent=None):
+        """
+        Sends `cookies` with all following requests, e.g. the cookies of a
+        browser session that has solved a captcha.
+
+        cookies: [list] of dicts with "name" and "value" keys, as returned
+            by selenium's `get_cookies`
+        user_agent: [str] replaces the User-Agent header, the cookies are
+            only honored for the browser that received them
+        """
+        self.headers['Cookie'] = '; '.join(
+            f'{c["name"]}={c["value"]}' for c in cookies
+        )
+        if user_agent:
+            self.headers['User-Agent'] = user_agent
 
-    def retrieve_completed(self):
-        completed = [f for f in self.futures if f.done()]
-        return [(html_from_future(f), self.futures.pop(f)) for f in completed]
+    def _collect(self, metrics):
+        running = sum(f._state == 'RUNNING' for f in list(self.futures))
+        metrics.gauge('scholar_http_backlog',
+                      'Urls queued or completed but not retrieved.').set(len(self.futures))
+        metrics.gauge('scholar_http_running', 'Http requests running.').set(running)
 
     @property
     def status(self):
         d = dict(Counter(f._state for f in self.futures))
         d['FREE'] = self.pool_size - d.get('RUNNING', 0)
+        d['BACKLOG'] = len(self.futures)
+        if self.cache is not None:
+            d['CACHE'] = self.cache.stats
         return d
 
 
@@ -0,0 +1,315 @@
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from hashlib import blake2b
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from .names import shave_marks_latin
+
+# Set of the urls, authors and titles crawled so far, kept across runs so
+# a new crawl does not fetch what an earlier one already did.  Keys are
+# hashed, so the set stays small: a Bloom filter uses about 14 bits per key
+# at a 0.1% false positive rate, the exact set 8 bytes per key.
+
+# query parameters that do not change the page content
+IGNORED_PARAMS = frozenset(['hl', 'oi', 'oe', 'authuser'])
+WORDS = re.compile(r'\w+')
+
+
+def canonical_url(url):
+    """
+    Returns `url` with a lower case scheme and host, without its fragment
+    and language parameters, and with its query parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in IGNORED_PARAMS
+    )
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+        urlencode(query), ''
+    ))
+
+
+def title_fingerprint(title):
+    """
+    Returns the words of `title` in lower case without marks, so titles
+    differing only in case, punctuation or accents match.
+    """
+    return ' '.join(WORDS.findall(shave_marks_latin(title).lower()))
+
+
+def search_title(url):
+    """
+    Returns the exact phrase searched by a title search `url`.
+    """
+    for k, v in parse_qsl(urlsplit(url).query):
+        if k == 'as_epq':
+            return v
+    return ''
+
+
+def request_fingerprint(request):
+    """
+    Returns the (kind, key) identifying the content of `request` across
+    crawls, or None if it can't be identified.  Authors are identified by
+    their profile id, title searches by the title searched and other
+    requests by their url.
+    """
+    name = request._name
+    if name == 'Author':
+        author_id = request.author_id
+        if author_id and not author_id.startswith('#'):
+            return 'author', author_id
+        return None
+    if name == 'TitleSearch':
+        title = title_fingerprint(search_title(request.request_url))
+        return ('title', title) if title else None
+    if request.request_url:
+        return 'url', canonical_url(request.request_url)
+    return None
+
+
+class BloomFilter:
+    """
+    Probabilistic set of digests.  Membership tests can give false
+    positives at about `error_rate` once `capacity` digests are added, but
+    never false negatives.
+    """
+    kind = 'bloom'
+
+    def __init__(self, capacity=2000000, error_rate=0.001):
+        """
+        capacity: [int] number of digests the filter is sized for
+        error_rate: [float] false positive rate at `capacity`
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.m = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def _positions(self, digest):
+        # double hashing, the digest provides two independent hashes
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def __contains__(self, digest):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest):
+        """
+        Adds `digest`, returns False if it was (probably) already present.
+        """
+        bits = self.bits
+        new = False
+        for p in self._positions(digest):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not bits[byte] & bit:
+                bits[byte] |= bit
+                new = True
+        self.n += new
+        return new
+
+    def header(self):
+        return {'capacity': self.capacity, 'error_rate': self.error_rate,
+                'm': self.m, 'k': self.k, 'n': self.n}
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, header, data):
+        obj = cls(header['capacity'], header['error_rate'])
+        if (obj.m, obj.k) != (header['m'], header['k']) or len(data) != len(obj.bits):
+            raise ValueError('Bloom filter parameters do not match its data.')
+        obj.bits = bytearray(data)
+        obj.n = header['n']
+        return obj
+
+
+class ExactSet:
+    """
+    Set of digests without false positives, other than collisions of their
+    first 8 bytes.
+    """
+    kind = 'exact'
+
+    def __init__(self):
+        self.keys = set()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, digest):
+        return int.from_bytes(digest[:8], 'little') in self.keys
+
+    def add(self, digest):
+        key = int.from_bytes(digest[:8], 'little')
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def header(self):
+        return {'n': len(self.keys)}
+
+    def to_bytes(self):
+        return array('Q', sorted(self.keys)).tobytes()
+
+    @classmethod
+    def from_bytes(cls, header, data):
+        obj = cls()
+        keys = array('Q')
+        keys.frombytes(data)
+        obj.keys = set(keys)
+        return obj
+
+
+class SeenSet:
+    """
+    Persistent set of the urls, author ids and titles already crawled,
+    shared by the `ScholarQueue` and its `RequestQueue`.  Each key belongs
+    to a kind, 'url', 'author' or 'title', and is normalized before it is
+    hashed, see `canonical_url` and `title_fingerprint`.
+    """
+    def __init__(self, path=None, exact=False, capacity=2000000,
+                 error_rate=0.001, save_every=10000):
+        """
+        path: [str] file the set is loaded from if it exists, and saved to
+        exact: [bool] keep the exact set of keys instead of a Bloom filter,
+            ignored when loading an existing file
+        capacity, error_rate: [int, float] sizing of the Bloom filter, see
+            `BloomFilter`
+        save_every: [int] number of keys added between saves of
+            `maybe_save`, 0 to only save on demand
+        """
+        self.path = path
+        self.save_every = save_every
+        self.n_added = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.digests = self.read(path)
+        elif exact:
+            self.digests = ExactSet()
+        else:
+            self.digests = BloomFilter(capacity, error_rate)
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {self.digests.kind}, {len(self)} keys, path={self.path!r}>'
+
+    def __len__(self):
+        return len(self.digests)
+
+    @staticmethod
+    def _digest(kind, key):
+        return blake2b(f'{kind}\0{key}'.encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    def _normalize(kind, key):
+        if kind == 'url':
+            return canonical_url(key)
+        if kind == 'title':
+            return title_fingerprint(key)
+        return key
+
+    def seen(self, kind, key):
+        """
+        Returns True if `key` of `kind` was added to the set.
+        """
+        return self._digest(kind, self._normalize(kind, key)) in self.digests
+
+    def add(self, kind, key):
+        """
+        Adds `key` of `kind` to the set, returns False if it was already
+        present.
+        """
+        digest = self._digest(kind, self._normalize(kind, key))
+        with self._lock:
+            new = self.digests.add(digest)
+            self.n_added += new
+        return new
+
+    def seen_url(self, url):
+        return self.seen('url', url)
+
+    def add_url(self, url):
+        return self.add('url', url)
+
+    def seen_author(self, author_id):
+        return self.seen('author', author_id)
+
+    def add_author(self, author_id):
+        return self.add('author', author_id)
+
+    def seen_title(self, title):
+        return self.seen('title', title)
+
+    def add_title(self, title):
+        return self.add('title', title)
+
+    def seen_request(self, request):
+        """
+        Returns True if the content of `request` was already crawled, see
+        `request_fingerprint`.
+        """
+        fp = request_fingerprint(request)
+        return fp is not None and self._digest(*fp) in self.digests
+
+    def add_request(self, request):
+        fp = request_fingerprint(request)
+        if fp is None:
+            return False
+        with self._lock:
+            new = self.digests.add(self._digest(*fp))
+            self.n_added += new
+        return new
+
+    @staticmethod
+    def read(path):
+        """
+        Reads the set saved at `path`.
+        """
+        with open(path, 'rb') as fp:
+            header = json.loads(fp.readline())
+            data = fp.read()
+        cls = {'bloom': BloomFilter, 'exact': ExactSet}[header.pop('kind')]
+        return cls.from_bytes(header, data)
+
+    def save(self, path=None):
+        """
+        Writes the set to `path`, by default the path it was loaded from.
+        The file is replaced atomically.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError('No path to save the seen set to.')
+        with self._lock:
+            header = dict(self.digests.header(), kind=self.digests.kind)
+            data = self.digests.to_bytes()
+            self.n_added = 0
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fp:
+            fp.write(json.dumps(header).encode() + b'\n')
+            fp.write(data)
+        os.replace(tmp, path)
+
+    def maybe_save(self):
+        """
+        Saves the set if `save_every` keys were added since the last save.
+        """
+        if self.path and self.save_every and self.n_added >= self.save_every:
+            self.save()
+            return True
+        return False
@@ -0,0 +1,285 @@
+import numpy as np
+
+
+class StringTable:
+    """
+    Immutable list of strings stored as one utf-8 buffer and the offsets of
+    each string in it.  Strings are only decoded when they are accessed.
+    """
+    def __init__(self, blob, offsets):
+        """
+        blob: [np.ndarray] uint8 buffer of the concatenated utf-8 strings
+        offsets: [np.ndarray] int64 start of each string, plus the end
+        """
+        self.blob = blob
+        self.offsets = offsets
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {len(self)} strings>'
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        data = self.blob.tobytes()
+        bounds = self.offsets.tolist()
+        return [
+            data[bounds[i]:bounds[i + 1]].decode('utf-8')
+            for i in range(len(bounds) - 1)
+        ]
+
+    @classmethod
+    def from_list(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+
+class Column:
+    """
+    Dictionary encoded column of strings: an int32 code for each row that
+    indexes a table of the distinct values.
+    """
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return f'<{n} {len(self.codes)} rows, {len(self.values)} values>'
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[int(self.codes[i])]
+
+    def tolist(self):
+        values = self.values.tolist()
+        return [values[c] for c in self.codes.tolist()]
+
+    @classmethod
+    def encode(cls, values):
+        index = {}
+        codes = np.fromiter(
+            (index.setdefault(v, len(index)) for v in values),
+            dtype=np.int32
+        )
+        return cls(codes, StringTable.from_list(list(index)))
+
+
+def _as_str(x):
+    if x is None:
+        return ''
+    return str(x)
+
+
+class GraphSnapshot:
+    """
+    Columnar, binary form of a crawled graph.  Node (author) and edge
+    (document) ids are interned to int32 indices, the edges are an (n, 3)
+    int32 array of (node, node, document) indices, and the attributes are
+    dictionary encoded string columns.  Snapshots are saved as an
+    uncompressed numpy `.npz` file, which loads without parsing.
+
+    Build one with `GraphSnapshot.from_graph` from an `AuthorGraph` or a
+    `graphs.Graph`.
+    """
+    def __init__(self, edges, node_ids, doc_ids, node_attrs, edge_attrs):
+        """
+        edges: [np.ndarray] (n, 3) int32 array of node, node, doc indices
+        node_ids: [StringTable] id of each node index
+        doc_ids: [StringTable] id of each document index
+        node_attrs: [dict] column name -> Column, one row per node index
+        edge_attrs: [dict] column name -> Column, one row per doc index
+        """
+        self.edges = edges
+        self.node_ids = node_ids
+        self.doc_ids = doc_ids
+        self.node_attrs = node_attrs
+        self.edge_attrs = edge_attrs
+
+    def __repr__(self):
+        n = self.__class__.__name__
+        return (f'<{n} {len(self.node_ids)} nodes, {len(self.doc_ids)} '
+                f'documents, {len(self.edges)} edges at 0x{id(self):x}>')
+
+    @classmethod
+    def from_rows(cls, edge_rows, node_rows, edge_attr_rows):
+        """
+        Builds a snapshot from iterables of rows, each starting with a
+        header row.  The first column of the node and edge attribute rows
+        is the node and document id.
+
+        edge_rows: [iterable] of node id, node id, document id
+        node_rows: [iterable] of node id, attributes...
+        edge_attr_rows: [iterable] of document id, attributes...
+        """
+        node_index, node_cols = cls._intern_rows(node_rows)
+        doc_index, doc_cols = cls._intern_rows(edge_attr_rows)
+
+        def intern(index, key):
+            i = index.get(key)
+            if i is None:
+                i = index[key] = len(index)
+            return i
+
+        edge_rows = iter(edge_rows)
+        next(edge_rows, None)
+        flat = np.fromiter(
+            (
+                i
+                for a1, a2, d in edge_rows
+                for i in (intern(node_index, a1),
+                          intern(node_index, a2),
+                          intern(doc_index, d))
+            ),
+            dtype=np.int32
+        )
+        edges = flat.reshape(-1, 3)
+
+        # nodes and documents only seen in the edges get blank attributes
+        node_attrs = cls._columns(node_cols, len(node_index))
+        edge_attrs = cls._columns(doc_cols, len(doc_index))
+        return cls(
+            edges,
+            StringTable.from_list(list(node_index)),
+            StringTable.from_list(list(doc_index)),
+            node_attrs,
+            edge_attrs
+        )
+
+    @staticmethod
+    def _intern_rows(rows):
+        rows = iter(rows)
+        header = next(rows, ())
+        index = {}
+        cols = {name: [] for name in header[1:]}
+        lists = list(cols.values())
+        for row in rows:
+            if row[0] in index:
+                continue
+            index[row[0]] = len(index)
+            for values, v in zip(lists, row[1:]):
+                values.append(_as_str(v))
+        return index, cols
+
+    @staticmethod
+    def _columns(cols, n):
+        out = {}
+        for name, values in cols.items():
+            values.extend([''] * (n - len(values)))
+            out[name] = Column.encode(values)
+        return out
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds a snapshot of an `AuthorGraph` or a `graphs.Graph`.
+        """
+        if hasattr(graph, 'generate_edge_list'):
+            return cls.from_rows(
+                graph.generate_edge_list(True),
+                graph.generate_node_attrs(True),
+                graph.generate_edge_attrs(True)
+            )
+        if hasattr(graph, 'edge_list'):
+            return cls.from_rows(
+                graph.edge_list(),
+                graph.node_attributes(),
+                graph.edge_attributes()
+            )
+        raise TypeError(f'Cannot snapshot a {graph.__class__.__name__}.')
+
+    def save(self, path):
+        """
+        Saves the snapshot as an uncompressed `.npz` file at `path`.
+        """
+        arrays = {'edges': self.edges}
+
+        def put(prefix, table):
+            arrays[prefix + '.blob'] = table.blob
+            arrays[prefix + '.offsets'] = table.offsets
+
+        put('node_ids', self.node_ids)
+        put('doc_ids', self.doc_ids)
+        for kind, attrs in (('node', self.node_attrs), ('edge', self.edge_attrs)):
+            put(kind + '_columns', StringTable.from_list(list(attrs)))
+            for i, col in enumerate(attrs.values()):
+                arrays[f'{kind}.{i}.codes'] = col.codes
+                put(f'{kind}.{i}.values', col.values)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a snapshot saved with `save`.  String tables are decoded
+        lazily, when they are accessed.
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            arrays = {k: npz[k] for k in npz.files}
+
+        def get(prefix):
+            return StringTable(arrays[prefix + '.blob'], arrays[prefix + '.offsets'])
+
+        attrs = {}
+        for kind in ('node', 'edge'):
+            names = get(kind + '_columns').tolist()
+            attrs[kind] = {
+                name: Column(arrays[f'{kind}.{i}.codes'], get(f'{kind}.{i}.values'))
+                for i, name in enumerate(names)
+            }
+        return cls(
+            arrays['edges'],
+            get('node_ids'),
+            get('doc_ids'),
+            attrs['node'],
+            attrs['edge']
+        )
+
+    def edge_list(self):
+        """
+        Yields the edges as node id, node id, document id.
+        """
+        node_ids = self.node_ids.tolist()
+        doc_ids = self.doc_ids.tolist()
+        for a1, a2, d in self.edges.tolist():
+            yield node_ids[a1], node_ids[a2], doc_ids[d]
+
+    def node_attributes(self):
+        """
+        Yields the node id and attributes of each node.
+        """
+        cols = [c.tolist() for c in self.node_attrs.values()]
+        return zip(self.node_ids.tolist(), *cols)
+
+    def edge_attributes(self):
+        """
+        Yields the document id and attributes of each document.
+        """
+        cols = [c.tolist() for c in self.edge_attrs.values()]
+        return zip(self.doc_ids.tolist(), *cols)
+
+
+def save_snapshot(graph, path):
+    """
+    Saves an `AuthorGraph` or `graphs.Graph` as a `GraphSnapshot` file.
+    """
+    snap = GraphSnapshot.from_graph(graph)
+    snap.save(path)
+    return snap
+
+
+def load_snapshot(path):
+    return GraphSnapshot.load(path)